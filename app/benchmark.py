@@ -0,0 +1,206 @@
+import os, json, tempfile, statistics
+from timeit import default_timer as timer
+from typing import Callable
+from PIL import Image
+from tools.rand import Rand
+from tools.sprite import create_ship, create_boom, create_bullet, create_powerup
+from tools.draw import draw_gradient_text
+from tools.background import draw_starfield, draw_landscape
+from tools.canvas import Canvas
+from tools.image import generate_wheel, generate_snap
+from app.generate import romlist_text
+
+SEED = "benchmark"
+BATCH = 1000
+IMAGE_SIZE = (320, 240)
+FULL_HD_SIZE = (1920, 1080)
+
+# -------------------------------------------------------------------------------------
+# Cases - each run starts from the same seeded stream so every repeat does equal work
+
+
+def bench_create_ship(rand: Rand, path: str):
+    create_ship(
+        size=(80, 60),
+        body_color=(220, 220, 220),
+        pod_color=(0, 220, 220),
+        detail_color=(200, 200, 200),
+        rng=rand.rng,
+    )
+
+
+def bench_create_boom(rand: Rand, path: str):
+    create_boom(
+        size=(80, 80),
+        col1=(255, 0, 0),
+        col2=(255, 150, 0),
+        col3=(255, 255, 0),
+        col4=(255, 255, 255),
+        rng=rand.rng,
+    )
+
+
+def bench_create_bullet(rand: Rand, path: str):
+    create_bullet(
+        size=(10, 20),
+        thickness=2,
+        radius=4,
+        fill=(255, 255, 255),
+        outline=(0, 200, 255),
+        rng=rand.rng,
+    )
+
+
+def bench_create_powerup(rand: Rand, path: str):
+    create_powerup(size=(20, 20), sides=6, col1=(0, 220, 220), col2=(220, 220, 220))
+
+
+def bench_draw_gradient_text(rand: Rand, path: str):
+    draw_gradient_text(
+        img=Image.new("RGBA", (400, 200)),
+        text="Benchmark\nText",
+        font=rand.font_foreground(100),
+        stroke=5,
+        stroke_color=(0, 16, 32),
+        pad=[10, 10],
+        col1=(255, 128, 0),
+        col2=(64, 255, 128),
+    )
+
+
+def bench_draw_starfield(rand: Rand, path: str):
+    draw_starfield(
+        Canvas(IMAGE_SIZE, (0, 0, 0, 255)),
+        200,
+        (1, 1),
+        [255, 255, 255, 128],
+        [255, 255, 255, 128],
+        [255, 255, 255, 128],
+        rng=rand.rng,
+    )
+
+
+def bench_draw_landscape(rand: Rand, path: str):
+    draw_landscape(Canvas(IMAGE_SIZE, (0, 0, 0, 255)), rand.rng)
+
+
+def bench_draw_landscape_1080p(rand: Rand, path: str):
+    draw_landscape(Canvas(FULL_HD_SIZE, (0, 0, 0, 255)), rand.rng)
+
+
+def bench_generate_wheel(rand: Rand, path: str):
+    generate_wheel("benchmark", "Benchmark Title (ver 1)", path, rand)
+
+
+def bench_generate_snap(rand: Rand, path: str):
+    generate_snap("benchmark", False, path, rand)
+
+
+def bench_rand_title(rand: Rand, path: str):
+    for i in range(BATCH):
+        rand.title()
+
+
+def bench_generate_romlist(rand: Rand, path: str):
+    for chunk in rand.roms(BATCH).chunks():
+        romlist_text(chunk, "Emulator0")
+
+
+# name: (case, items per run)
+CASES: dict[str, tuple[Callable[[Rand, str], None], int]] = {
+    "create_ship": (bench_create_ship, 1),
+    "create_boom": (bench_create_boom, 1),
+    "create_bullet": (bench_create_bullet, 1),
+    "create_powerup": (bench_create_powerup, 1),
+    "draw_gradient_text": (bench_draw_gradient_text, 1),
+    "draw_starfield": (bench_draw_starfield, 1),
+    "draw_landscape": (bench_draw_landscape, 1),
+    "draw_landscape_1080p": (bench_draw_landscape_1080p, 1),
+    "generate_wheel": (bench_generate_wheel, 1),
+    "generate_snap": (bench_generate_snap, 1),
+    "rand_title": (bench_rand_title, BATCH),
+    "generate_romlist": (bench_generate_romlist, BATCH),
+}
+
+# -------------------------------------------------------------------------------------
+# Runner
+
+
+def run_case(name: str, rand: Rand, path: str, repeat: int) -> dict:
+    """Time case repeat times after a warmup run, return ms per item"""
+    case, items = CASES[name]
+    case(rand.stream(name), path)
+    runs = []
+    for i in range(repeat):
+        stream = rand.stream(name)
+        start = timer()
+        case(stream, path)
+        runs.append((timer() - start) * 1000 / items)
+    return {
+        "items": items,
+        "median_ms": statistics.median(runs),
+        "p95_ms": percentile(runs, 95),
+        "runs_ms": runs,
+    }
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return names of cases with a median slower than baseline by over threshold"""
+    regressions = []
+    for name, result in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base and result["median_ms"] > base["median_ms"] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def benchmark(
+    config: str = "",
+    cases: list[str] = None,
+    repeat: int = 10,
+    output: str = None,
+    baseline: str = None,
+    threshold: float = 0.1,
+) -> bool:
+    """Run cases, print results and return False if any regressed against baseline"""
+    rand = Rand(os.path.join(os.getcwd(), config), SEED)
+    names = cases or list(CASES)
+    for name in names:
+        if name not in CASES:
+            raise ValueError(f"Unknown case {name}, expected one of {', '.join(CASES)}")
+
+    base = None
+    if baseline:
+        with open(baseline) as file:
+            base = json.load(file)
+
+    results = {"seed": SEED, "repeat": repeat, "cases": {}}
+    header = f"{'Case':<20}{'Median ms':>12}{'P95 ms':>12}"
+    print(header + (f"{'Baseline ms':>14}{'Change':>10}" if base else ""))
+    with tempfile.TemporaryDirectory() as path:
+        for name in names:
+            result = run_case(name, rand, path, repeat)
+            results["cases"][name] = result
+            line = f"{name:<20}{result['median_ms']:>12.3f}{result['p95_ms']:>12.3f}"
+            if base and name in base["cases"]:
+                base_ms = base["cases"][name]["median_ms"]
+                change = (result["median_ms"] / base_ms - 1) * 100
+                line += f"{base_ms:>14.3f}{change:>+9.1f}%"
+            print(line, flush=True)
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if not base:
+        return True
+    regressions = compare(results, base, threshold)
+    for name in regressions:
+        print(f"REGRESSION: {name} median slower than baseline by over {threshold:.0%}")
+    return not regressions
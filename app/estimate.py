@@ -0,0 +1,302 @@
+import os, sys, secrets, shutil, tempfile
+from time import process_time
+from tools.rand import Rand
+from tools.utils import mkdir_if_none
+from tools.writer import ImageWriter, link_file
+from app.generate import (
+    init_worker,
+    generate_config,
+    generate_display,
+    generate_artwork,
+    generate_layout,
+    rom_artwork,
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SAMPLE_ROMS = 1000
+SAMPLE_ARTWORK = 10
+
+# -------------------------------------------------------------------------------------
+# Helpers
+
+
+def peak_memory() -> int:
+    """Peak resident bytes of this process, 0 where unsupported"""
+    if not resource:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def disk_size(path: str) -> int:
+    """Bytes allocated to file at path, rounded up to whole blocks where known"""
+    stat = os.stat(path)
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+
+def tree_size(path: str) -> int:
+    return sum(
+        disk_size(os.path.join(root, name))
+        for root, dirs, files in os.walk(path)
+        for name in files
+    )
+
+
+def format_size(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+
+# -------------------------------------------------------------------------------------
+
+
+class Sample:
+    """Bytes and cpu seconds measured per item from a seeded sample"""
+
+    config_bytes: int
+    display_bytes: float
+    rom_bytes: float
+    rom_seconds: float
+    snap_bytes: float
+    snap_seconds: float
+    wheel_bytes: float
+    wheel_seconds: float
+    link_seconds: float
+    base_memory: int
+    worker_memory: int
+
+    def __init__(self):
+        self.config_bytes = 0
+        self.display_bytes = 0
+        self.rom_bytes = 0
+        self.rom_seconds = 0
+        self.snap_bytes = 0
+        self.snap_seconds = 0
+        self.wheel_bytes = 0
+        self.wheel_seconds = 0
+        self.link_seconds = 0
+        self.base_memory = 0
+        self.worker_memory = 0
+
+
+class Estimate:
+    """Disk, time and memory predicted for a run"""
+
+    disk: float
+    seconds: float
+    memory: float
+    available: int
+    rows: list[tuple[str, int, float, float]]
+
+    def __init__(self):
+        self.disk = 0
+        self.seconds = 0
+        self.memory = 0
+        self.available = 0
+        self.rows = []
+
+    def add(self, stage: str, count: int, disk: float, seconds: float):
+        """Add count items of stage, using disk bytes and cpu seconds in total"""
+        self.rows.append((stage, count, disk, seconds))
+        self.disk += disk
+
+    def __str__(self) -> str:
+        lines = [f"{'Stage':<20}{'Count':>10}{'Disk':>14}{'CPU':>12}"]
+        for stage, count, disk, seconds in self.rows:
+            lines.append(
+                f"{stage:<20}{count:>10}{format_size(disk):>14}"
+                f"{format_time(seconds):>12}"
+            )
+        memory = format_size(self.memory) if self.memory else "unknown"
+        lines.append(f"Disk {format_size(self.disk)} of {format_size(self.available)}")
+        lines.append(f"Time {format_time(self.seconds)}")
+        lines.append(f"Peak memory {memory}")
+        return "\n".join(lines)
+
+
+def sample_run(
+    path: str,
+    rand: Rand,
+    roms: int,
+    snap: bool,
+    wheel: bool,
+    basic: bool,
+    rotate_step: float,
+    link_mode: str,
+    sample: int,
+    sprite_variants: int = 0,
+    sprite_fresh: float = 0.25,
+) -> Sample:
+    """Generate one small display and a few artworks in path, measuring each"""
+    result = Sample()
+    result.base_memory = peak_memory()
+    emulators_path = mkdir_if_none(os.path.join(path, "emulators", ""))
+    romlists_path = mkdir_if_none(os.path.join(path, "romlists", ""))
+    stats_path = mkdir_if_none(os.path.join(path, "stats", ""))
+    image_path = mkdir_if_none(os.path.join(path, "images", ""))
+    snaps_path = mkdir_if_none(os.path.join(image_path, "snap", ""))
+    wheels_path = mkdir_if_none(os.path.join(image_path, "wheel", ""))
+    init_worker(rand, sprite_variants=sprite_variants, sprite_fresh=sprite_fresh)
+
+    result.config_bytes = len(generate_layout()) + len(
+        generate_config("Display0", "Emulator0", rand.stream("Display0"))
+    )
+
+    # metadata - romlist, favourites, tags and stats all scale by rom
+    limit = max(1, min(roms, SAMPLE_ROMS))
+    start = process_time()
+    generate_display(
+        "Emulator0",
+        limit,
+        path,
+        emulators_path,
+        romlists_path,
+        stats_path,
+        snaps_path,
+        wheels_path,
+        "",
+        0,
+        None,
+    )
+    result.rom_seconds = (process_time() - start) / limit
+    result.display_bytes = tree_size(emulators_path)
+    result.rom_bytes = (tree_size(path) - result.display_bytes) / limit
+
+    # artwork - rendered and saved inline so cpu time includes encoding
+    writer = ImageWriter(threads=0)
+    items = rom_artwork((0, min(sample, limit), 0, 1), limit)
+    args = (snaps_path, wheels_path)
+    options = (basic, rand, writer, rotate_step)
+    for display, rom_name, rom_title, _ in items:
+        if snap:
+            start = process_time()
+            generate_artwork(display, rom_name, rom_title, *args, True, False, *options)
+            result.snap_seconds += process_time() - start
+        if wheel:
+            start = process_time()
+            generate_artwork(display, rom_name, rom_title, *args, False, True, *options)
+            result.wheel_seconds += process_time() - start
+
+    # clears the line
+    print("\033[K", end="\r", flush=True)
+
+    result.worker_memory = peak_memory()
+    if items:
+        result.snap_seconds /= len(items)
+        result.wheel_seconds /= len(items)
+        result.snap_bytes = tree_size(snaps_path) / len(items)
+        result.wheel_bytes = tree_size(wheels_path) / len(items)
+
+        # links - every sampled asset linked once
+        source = os.path.join(snaps_path if snap else wheels_path, f"{items[0][1]}.png")
+        start = process_time()
+        for i in range(len(items)):
+            link_file(source, os.path.join(path, f"link{i}.png"), link_mode)
+        result.link_seconds = (process_time() - start) / len(items)
+    return result
+
+
+def estimate(
+    output: str = "",
+    config: str = "",
+    font_cache_path: str = None,
+    displays: int = 10,
+    roms: int = 1000,
+    single_thread: bool = False,
+    snap: bool = False,
+    wheel: bool = False,
+    basic: bool = False,
+    randomize: bool = False,
+    seed: str = "",
+    display_limit: int = 1000,
+    rom_limit: int = 100000,
+    rotate_step: float = 0,
+    asset_pool: int = 0,
+    link_mode: str = "hard",
+    wheel_titles: bool = False,
+    sample: int = SAMPLE_ARTWORK,
+    sprite_variants: int = 0,
+    sprite_fresh: float = 0.25,
+) -> Estimate:
+    """Predict disk, time and peak memory of a run from a small seeded sample"""
+    seed = secrets.token_hex(8) if randomize else seed
+    rand = Rand(os.path.join(os.getcwd(), config), seed, font_cache_path)
+    displays = min(display_limit, displays)
+    roms = min(rom_limit, roms)
+    total_roms = displays * roms
+    workers = 1 if single_thread else os.cpu_count() or 1
+
+    path = tempfile.mkdtemp()
+    try:
+        measured = sample_run(
+            path,
+            rand,
+            roms,
+            snap,
+            wheel,
+            basic,
+            rotate_step,
+            link_mode,
+            sample,
+            sprite_variants,
+            sprite_fresh,
+        )
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    # pooled assets render once, every rom is linked to one
+    snaps = total_roms if snap else 0
+    wheels = total_roms if wheel else 0
+    links = 0
+    if asset_pool:
+        links = snaps + wheels
+        snaps = min(snaps, asset_pool)
+        if not wheel_titles:
+            wheels = min(wheels, asset_pool)
+    link_bytes = measured.snap_bytes if snap else measured.wheel_bytes
+    link_bytes = link_bytes if link_mode == "copy" else 0
+
+    display_seconds = total_roms * measured.rom_seconds
+    snap_seconds = snaps * measured.snap_seconds
+    wheel_seconds = wheels * measured.wheel_seconds
+    link_seconds = links * measured.link_seconds
+
+    result = Estimate()
+    result.available = shutil.disk_usage(os.path.dirname(output) or ".")[2]
+    result.add("config", 1, measured.config_bytes, 0)
+    result.add(
+        "display",
+        displays,
+        displays * measured.display_bytes + total_roms * measured.rom_bytes,
+        display_seconds,
+    )
+    result.add("snap", snaps, snaps * measured.snap_bytes, snap_seconds)
+    result.add("wheel", wheels, wheels * measured.wheel_bytes, wheel_seconds)
+    if asset_pool:
+        result.add("link", links, links * link_bytes, link_seconds)
+
+    # displays spread over workers by display, artwork and links by rom
+    result.seconds = (
+        display_seconds / min(workers, max(1, displays))
+        + (snap_seconds + wheel_seconds + link_seconds) / workers
+    )
+
+    # items are built by workers, so each peaks like the sample at any count
+    if measured.worker_memory:
+        parent = 0 if single_thread else measured.base_memory
+        result.memory = parent + workers * measured.worker_memory
+    return result
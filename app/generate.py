@@ -1,34 +1,258 @@
-from timeit import default_timer as timer
-
-start_time = timer()
-import re, os
+import os, secrets, shutil, tempfile, hashlib
 import multiprocessing as mp
-from random import seed, randint, shuffle
-from tools.rand import Rand
+from multiprocessing.util import Finalize
+from timeit import default_timer as timer
+from contextlib import nullcontext
+from functools import partial
+from itertools import chain
+from typing import Iterable
+from tools.rand import Rand, RomChunk, Romlist, ROM_CHUNK
 from tools.utils import mkdir_if_none
+from tools.writer import FileWriter, ImageWriter, link_file
+from tools.archive import Archive, find_archives
+from tools.metrics import Metrics, MetricsReport, metrics
+from tools.profiler import TaskProfiler, SampleProfiler, merge_profiles
 from tools.image import generate_wheel, generate_snap
+from tools.sprite import sprite_pool
+from tools.font import font_cache
 
 ROM_HEADER = "#Name;Title;Emulator;CloneOf;Year;Manufacturer;Category;Players;Rotation;Control;Status;DisplayCount;DisplayType;AltRomname;AltTitle;Extra;Buttons;Series;Language;Region;Rating"
+ROM_LINE = "{};{};{emulator};;{};{};{};{};{};{};{};1;raster;;;;{};;{};;\n"
+ROM_FIELDS = [
+    "name",
+    "title",
+    "year",
+    "manufacturer",
+    "category",
+    "players",
+    "rotation",
+    "control",
+    "status",
+    "buttons",
+    "language",
+]
+ARTWORK_CHUNK_MAX = 32
+LINK_CHUNK = 1000
+WRITE_BUFFER = 1 << 20
+
+# Shared by every task in a worker, inherited copy-on-write when forked
+worker_rand: Rand = None
+worker_archive: Archive = None
+worker_profiler: TaskProfiler | SampleProfiler = None
+worker_romlists: dict[str, Romlist] = {}
 
 # -------------------------------------------------------------------------------------
 # Helpers
 
 
-def title_to_romname(title: str) -> str:
-    """Long title to short romname"""
-    parts = re.sub(r"\([^)]+\)|[^a-z ]", "", title.lower()).strip().split(" ")
-    return "".join([p[:2] for p in parts])
+def artwork_chunk_size(count: int, workers: int) -> int:
+    """Return roms per artwork task, small enough to keep every worker busy"""
+    return max(1, min(ARTWORK_CHUNK_MAX, count // (workers * 4)))
+
+
+def artwork_ranges(displays: int, count: int, workers: int):
+    """Yield (start, stop, first, last) rows and displays of each artwork task
+
+    Rows are split first, each task holding those rows for every display. Displays
+    are only split too when there are too few rows to keep every worker busy.
+    """
+    size = artwork_chunk_size(displays * count, workers)
+    rows = max(1, size // displays)
+    group = displays if count >= workers * 4 else size
+    for start, stop in chunk_ranges(count, rows):
+        for first in range(0, displays, group):
+            yield start, stop, first, min(displays, first + group)
+
+
+def chunk_ranges(count: int, rows: int):
+    """Yield (start, stop) of rows at most rows long, none crossing a rom chunk
+
+    Each range then only needs one chunk of every romlist, which the worker keeps
+    while its next ranges read the rows after.
+    """
+    for chunk in range(0, count, ROM_CHUNK):
+        stop = min(count, chunk + ROM_CHUNK)
+        for start in range(chunk, stop, rows):
+            yield start, min(stop, start + rows)
+
+
+def emulator_name(index: int) -> str:
+    return f"Emulator{index}"
+
 
+def title_asset(title: str) -> str:
+    """Return name of the pooled wheel showing title"""
+    return hashlib.md5(title.encode()).hexdigest()
 
-def random_romnames(romlist: list, min: float = 0.20, max: float = 0.30) -> list:
-    """Return slice of random romnames"""
-    shuffle(romlist)
-    n = len(romlist)
-    roms = [rom[0] for rom in romlist[: randint(int(n * min), int(n * max))]]
-    roms.sort()
+
+def init_worker(
+    rand: Rand,
+    archive: Archive = None,
+    profile_path: str = None,
+    profile_mode: str = "cprofile",
+    sprite_variants: int = 0,
+    sprite_fresh: float = 0.25,
+):
+    """Pool initializer, keeps rand for tasks rather than pickling it into each
+
+    Every catalog font is loaded here, so tasks only derive sizes from them.
+    """
+    global worker_rand, worker_archive, worker_profiler
+    worker_rand = rand
+    worker_archive = archive
+    worker_romlists.clear()
+    sprite_pool.configure(sprite_variants, sprite_fresh)
+    font_cache.preload(
+        rand.fonts_display + rand.fonts_foreground + rand.fonts_background
+    )
+    if archive:
+        # completes the worker shard when the pool is closed and joined
+        Finalize(archive, archive.close, exitpriority=10)
+    if profile_path:
+        profiler = SampleProfiler if profile_mode == "sample" else TaskProfiler
+        worker_profiler = profiler(profile_path)
+
+
+def profile_task():
+    """Profile task if enabled for this worker"""
+    return worker_profiler.task() if worker_profiler else nullcontext()
+
+
+def worker_romlist(display: str, count: int) -> Romlist:
+    """Return romlist of display, kept by the worker along with its last chunk"""
+    roms = worker_romlists.get(display)
+    if not roms or roms.count != count:
+        roms = worker_rand.stream(display, "romlist").roms(count)
+        worker_romlists[display] = roms
     return roms
 
 
+def rom_artwork(
+    rows: tuple[int, int, int, int], count: int
+) -> list[tuple[str, str, str, int]]:
+    """Return (display, romname, title, position) of each rom in rows
+
+    Rows are (start, stop, first, last) from artwork_ranges, each romlist rebuilt
+    from its seed, so items never pass through the parent. Position numbers every
+    rom by display, then row.
+
+    Every display writes to the same artwork paths, so a romname repeated by
+    another display would render its own image over the first, the winner
+    depending on scheduling. Romnames end in their row, so one can only repeat
+    at the same row of another display. Only the first display keeps it, those
+    before first are rebuilt to find it.
+    """
+    start, stop, first, last = rows
+    items = []
+    names = set()
+    for index in range(last):
+        display = emulator_name(index)
+        roms = worker_romlist(display, count)
+        fields = roms.columns(["name", "title"], slice(start, stop))
+        for row, (rom_name, rom_title) in enumerate(fields, start):
+            if rom_name not in names:
+                names.add(rom_name)
+                if index >= first:
+                    items.append((display, rom_name, rom_title, index * count + row))
+    return items
+
+
+def pool_artwork(start: int, stop: int) -> list[tuple[str, str, str]]:
+    """Return ("pool", asset, title) of pooled assets start to stop"""
+    return [
+        ("pool", str(asset), worker_rand.stream("pool", asset).title())
+        for asset in range(start, stop)
+    ]
+
+
+def title_artwork(
+    rows: tuple[int, int, int, int], count: int, path: str
+) -> list[tuple[str, str, str]]:
+    """Return ("title", asset, title) of each title of roms in rows not yet in path"""
+    items = {}
+    for display, rom_name, rom_title, position in rom_artwork(rows, count):
+        asset = title_asset(rom_title)
+        if asset not in items and not os.path.exists(
+            os.path.join(path, f"{asset}.png")
+        ):
+            items[asset] = ("title", asset, rom_title)
+    return list(items.values())
+
+
+def artwork_tasks(
+    displays: int,
+    count: int,
+    workers: int,
+    artwork_args: tuple,
+    pool_path: str = None,
+    asset_pool: int = 0,
+    link_mode: str = "hard",
+    wheel_titles: bool = False,
+) -> tuple[Iterable[tuple], Iterable[tuple]]:
+    """Return render tasks then link tasks for artwork, chunked over workers
+
+    Tasks hold ranges, their items are built by the worker. Pooled assets are
+    rendered once into pool_path and every rom is linked to one by position, or
+    to the wheel showing its title if wheel_titles.
+    """
+    snaps_path, wheels_path, snap, wheel, *options = artwork_args
+    if not snap and not wheel:
+        return [], []
+    ranges = partial(artwork_ranges, displays, count, workers)
+    if not asset_pool:
+        render_tasks = (
+            (rom_artwork, (rows, count), *artwork_args) for rows in ranges()
+        )
+        return render_tasks, []
+
+    # pooled assets by position, then each title once if wheels show the title
+    pool_snaps = os.path.join(pool_path, "snap", "")
+    pool_wheels = os.path.join(pool_path, "wheel", "")
+    assets = min(asset_pool, displays * count)
+    size = artwork_chunk_size(assets, workers)
+    pool_wheel = wheel and not wheel_titles
+    pooled = (pool_snaps, pool_wheels, snap, pool_wheel, *options)
+    titled = (None, pool_wheels, False, True, *options)
+    render_tasks = chain(
+        (
+            (pool_artwork, (start, min(assets, start + size)), *pooled)
+            for start in range(0, assets, size)
+            if snap or pool_wheel
+        ),
+        (
+            (title_artwork, (rows, count, pool_wheels), *titled)
+            for rows in (ranges() if wheel and wheel_titles else [])
+        ),
+    )
+
+    links = []
+    if snap:
+        links.append((snaps_path, pool_snaps, False))
+    if wheel:
+        links.append((wheels_path, pool_wheels, wheel_titles))
+    rows = max(1, LINK_CHUNK // displays)
+    link_tasks = (
+        ((start, stop, 0, displays), count, links, assets, link_mode)
+        for start, stop in chunk_ranges(count, rows)
+    )
+    return render_tasks, link_tasks
+
+
+def write_text(path: str, text: str, archive: Archive = None):
+    """Write text to path, added to archive if given"""
+    if archive:
+        archive.add(path, text.encode())
+    else:
+        with open(path, "w") as file:
+            file.write(text)
+
+
+def write_romnames(writer: FileWriter, path: str, romnames: Iterable[str]):
+    """Write romnames to tag file"""
+    with writer.open(path, "w", buffering=WRITE_BUFFER) as file:
+        file.writelines(f"{romname}\n" for romname in romnames)
+
+
 # -------------------------------------------------------------------------------------
 # Output matches AM formatting
 
@@ -75,36 +299,11 @@ artwork    wheel           {wheels_path}
 """
 
 
-def generate_rom(
-    index: int,
-    emulator: str,
-    rand: Rand,
-) -> list:
-    title = rand.title()
-    players = rand.players()
-    return [
-        f"{title_to_romname(title)}{index}",
-        title,
-        emulator,
-        "",
-        rand.year(),
-        rand.manufacturer(),
-        rand.category(),
-        f"{players}",
-        rand.rotation(),
-        ",".join([rand.joystick()] * players),
-        rand.status(),
-        "1",
-        "raster",
-        "",
-        "",
-        "",
-        rand.buttons(),
-        "",
-        rand.language(),
-        "",
-        "",
-    ]
+def romlist_text(chunk: RomChunk, emulator: str) -> str:
+    """Join rows of romlist chunk into romlist lines"""
+    line = partial(ROM_LINE.format, emulator=emulator)
+    columns = [chunk.column(field) for field in ROM_FIELDS]
+    return "".join(map(line, *columns))
 
 
 def generate_layout() -> str:
@@ -133,81 +332,225 @@ function on_signal(signal) {
 """
 
 
+def generate_artwork(
+    display: str,
+    rom_name: str,
+    rom_title: str,
+    snaps_path: str,
+    wheels_path: str,
+    snap: bool,
+    wheel: bool,
+    basic: bool,
+    rand: Rand,
+    writer: ImageWriter,
+    rotate_step: float,
+):
+    """Render wheel and snap artwork for a single rom, each from its own stream"""
+    print(rom_title.ljust(50), end="\r", flush=True)
+    rom = rand.stream(display, rom_name)
+    if wheel:
+        start, caller = timer(), writer.caller
+        generate_wheel(rom_name, rom_title, wheels_path, rom.stream("wheel"), writer)
+        metrics.add("wheel", timer() - start - (writer.caller - caller))
+    if snap:
+        start, caller = timer(), writer.caller
+        generate_snap(
+            rom_name, basic, snaps_path, rom.stream("snap"), writer, rotate_step
+        )
+        metrics.add("snap", timer() - start - (writer.caller - caller))
+
+
+def generate_artwork_chunk(
+    chunk: list[tuple],
+    snaps_path: str,
+    wheels_path: str,
+    snap: bool,
+    wheel: bool,
+    basic: bool,
+    encode_threads: int,
+    encode_queue: int,
+    rotate_step: float,
+) -> Metrics:
+    """Render artwork for a chunk of items starting (display, romname, title)"""
+    rand = worker_rand
+    writer = ImageWriter(
+        threads=encode_threads, queue=encode_queue, archive=worker_archive
+    )
+    try:
+        with metrics.time("artwork"), writer:
+            for display, rom_name, rom_title, *_ in chunk:
+                generate_artwork(
+                    display,
+                    rom_name,
+                    rom_title,
+                    snaps_path,
+                    wheels_path,
+                    snap,
+                    wheel,
+                    basic,
+                    rand,
+                    writer,
+                    rotate_step,
+                )
+
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+    except Exception as err:
+        print(err)
+
+    metrics.add("encode", writer.stats.encode, writer.stats.images)
+    metrics.add("encode.blocked", writer.stats.blocked, 0)
+    if sprite_pool.variants:
+        metrics.peak("sprite.pool", sprite_pool.bytes)
+    return metrics.pop()
+
+
+def link_artwork_chunk(
+    rows: tuple[int, int, int, int],
+    count: int,
+    links: list[tuple[str, str, bool]],
+    size: int,
+    link: str,
+) -> Metrics:
+    """Link artwork of each rom in rows to its pooled asset
+
+    links holds (path, pool path, titles) for each artwork, assets chosen by
+    title if titles, otherwise by position among size assets.
+    """
+    try:
+        with metrics.time("link.roms"):
+            items = rom_artwork(rows, count)
+        with metrics.time("link", len(items) * len(links)):
+            for path, pool_path, titles in links:
+                for display, rom_name, rom_title, position in items:
+                    asset = title_asset(rom_title) if titles else position % size
+                    link_file(
+                        os.path.join(pool_path, f"{asset}.png"),
+                        os.path.join(path, f"{rom_name}.png"),
+                        link,
+                    )
+
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+    except Exception as err:
+        print(err)
+
+    return metrics.pop()
+
+
+def link_artwork_task(args: tuple) -> tuple[int, Metrics]:
+    """Pool entry point for link_artwork_chunk, returns metrics by worker"""
+    with profile_task():
+        return os.getpid(), link_artwork_chunk(*args)
+
+
+def generate_artwork_task(args: tuple) -> tuple[int, Metrics]:
+    """Pool entry point for generate_artwork_chunk, returns metrics by worker
+
+    args starts with the function and arguments building the chunk of items.
+    """
+    items, items_args, *args = args
+    with profile_task():
+        return os.getpid(), generate_artwork_chunk(items(*items_args), *args)
+
+
+def generate_display_task(*args) -> tuple[int, Metrics]:
+    """Pool entry point for generate_display, returns metrics by worker"""
+    with profile_task():
+        generate_display(*args)
+    return os.getpid(), metrics.pop()
+
+
 def generate_display(
     name: str,
     limit: int,
+    config_path: str,
     emulators_path: str,
     romlists_path: str,
     stats_path: str,
     snaps_path: str,
     wheels_path: str,
     cfg_header: str,
-    snap: bool,
-    wheel: bool,
-    basic: bool,
-    rand: Rand,
-    randomize: bool,
+    write_threads: int,
+    stage_path: str,
 ):
+    """Write display config, romlist, favourites, tags and stats"""
+    rand = worker_rand.stream(name)
+    writer = FileWriter(
+        config_path,
+        threads=write_threads,
+        stage_path=stage_path,
+        archive=worker_archive,
+    )
     try:
-        if not randomize:
-            seed(name)
-        emulator = generate_emulator(name, snaps_path, wheels_path, rand)
-        romlist = [generate_rom(i, name, rand) for i in range(limit)]
-
-        # print on same line to indicate activity
-        print(name, end="\r", flush=True)
-
-        # artwork
-        if wheel or snap:
-            for rom in romlist:
-                rom_name = rom[0]
-                rom_title = rom[1]
-                print(rom_title.ljust(50), end="\r", flush=True)
-                if wheel:
-                    if not randomize:
-                        seed(rom_name)
-                    generate_wheel(rom_name, rom_title, wheels_path, rand)
-                if snap:
-                    if not randomize:
-                        seed(rom_name)
-                    generate_snap(rom_name, basic, snaps_path, rand)
-
-        # clears the line
-        print("\033[K", end="\r", flush=True)
-
-        # romlist
-        with open(os.path.join(romlists_path, f"{name}.txt"), "w") as file:
-            file.write(ROM_HEADER + "\n")
-            for rom in romlist:
-                line = ";".join(rom)
-                file.write(f"{line}\n")
-
-        # emulator
-        with open(os.path.join(emulators_path, f"{name}.cfg"), "w") as file:
-            file.write(cfg_header + emulator)
-
-        # favourites
-        with open(os.path.join(romlists_path, f"{name}.tag"), "w") as file:
-            file.write("\n".join(random_romnames(romlist)))
-
-        # tags
-        for tag in rand.tags(randint(2, 4)):
-            mkdir_if_none(os.path.join(romlists_path, name))
-            with open(os.path.join(romlists_path, name, f"{tag}.tag"), "w") as file:
-                file.write("\n".join(random_romnames(romlist)))
-
-        # stats
-        mkdir_if_none(os.path.join(stats_path, name))
-        for romname in random_romnames(romlist):
-            with open(os.path.join(stats_path, name, f"{romname}.stat"), "w") as file:
-                file.write(f"{randint(0, 100)}\n{randint(100, 10000)}\n")
+        with metrics.time("display"), writer:
+            emulator = generate_emulator(name, snaps_path, wheels_path, rand)
+
+            # print on same line to indicate activity
+            print(name, end="\r", flush=True)
+
+            # romlist - rebuilt from its seed and written a chunk at a time
+            roms = rand.stream("romlist").roms(limit)
+            writer.makedirs(emulators_path)
+            writer.makedirs(romlists_path)
+            romlist_path = os.path.join(romlists_path, f"{name}.txt")
+            with writer.open(romlist_path, "w", buffering=WRITE_BUFFER) as file:
+                file.write(ROM_HEADER + "\n")
+                for start in range(0, limit, ROM_CHUNK):
+                    with metrics.time("rom", min(ROM_CHUNK, limit - start)):
+                        text = romlist_text(roms.chunk(start), name)
+                    file.write(text)
+            # clears the line
+            print("\033[K", end="\r", flush=True)
+
+            # emulator
+            writer.write(
+                os.path.join(emulators_path, f"{name}.cfg"), cfg_header + emulator
+            )
+
+            # favourites
+            rng = rand.stream("favourites").generator()
+            write_romnames(
+                writer,
+                os.path.join(romlists_path, f"{name}.tag"),
+                roms.column("name", roms.select(rng)),
+            )
+
+            # tags
+            tags = rand.stream("tags")
+            tags_path = writer.makedirs(os.path.join(romlists_path, name))
+            names = tags.tags(tags.rng.randint(2, 4))
+            rng = tags.generator()
+            for tag in names:
+                write_romnames(
+                    writer,
+                    os.path.join(tags_path, f"{tag}.tag"),
+                    roms.column("name", roms.select(rng)),
+                )
+
+            # stats
+            rng = rand.stream("stats").generator()
+            stat_path = writer.makedirs(os.path.join(stats_path, name))
+            for rows in roms.select(rng):
+                played = rng.integers(0, 100, len(rows), endpoint=True)
+                seconds = rng.integers(100, 10000, len(rows), endpoint=True)
+                romnames = roms.column("name", [rows])
+                for romname, count, time in zip(romnames, played, seconds):
+                    writer.write(
+                        os.path.join(stat_path, f"{romname}.stat"),
+                        f"{count}\n{time}\n",
+                    )
 
     except (KeyboardInterrupt, SystemExit):
-        return
+        pass
 
     except Exception as err:
         print(err)
-        return
+
+    finally:
+        metrics.add("files", writer.stats.seconds, writer.stats.files)
 
 
 # -------------------------------------------------------------------------------------
@@ -216,6 +559,7 @@ def generate_display(
 def generate(
     output: str = "",
     config: str = "",
+    font_cache_path: str = None,
     displays: int = 10,
     roms: int = 1000,
     single_thread: bool = False,
@@ -224,7 +568,26 @@ def generate(
     basic: bool = False,
     version: str = "",
     randomize: bool = False,
+    seed: str = "",
+    write_threads: int = 4,
+    stage_path: str = None,
+    encode_threads: int = 2,
+    encode_queue: int = 4,
+    display_limit: int = 1000,
+    rom_limit: int = 100000,
+    rotate_step: float = 0,
+    metrics_path: str = None,
+    profile: str = None,
+    profile_mode: str = "cprofile",
+    archive_format: str = None,
+    shard_size: int = 1 << 30,
+    asset_pool: int = 0,
+    link_mode: str = "hard",
+    wheel_titles: bool = False,
+    sprite_variants: int = 0,
+    sprite_fresh: float = 0.25,
 ):
+    start = timer()
     config_path = mkdir_if_none(output)
     emulators_path = mkdir_if_none(os.path.join(config_path, "emulators", ""))
     romlists_path = mkdir_if_none(os.path.join(config_path, "romlists", ""))
@@ -232,51 +595,133 @@ def generate(
     image_path = mkdir_if_none(os.path.join(config_path, "images", ""))
     snaps_path = mkdir_if_none(os.path.join(image_path, "snap", ""))
     wheels_path = mkdir_if_none(os.path.join(image_path, "wheel", ""))
+    pool_path = None
+    if asset_pool:
+        # pooled assets render here, every rom path links to one of them
+        pool_path = mkdir_if_none(os.path.join(image_path, "pool", ""))
+        mkdir_if_none(os.path.join(pool_path, "snap", ""))
+        mkdir_if_none(os.path.join(pool_path, "wheel", ""))
     layout_path = mkdir_if_none(os.path.join(config_path, "layouts", ""))
     generate_layout_path = mkdir_if_none(os.path.join(layout_path, "generate-plus", ""))
     cfg_header = f"# Generated by {version}\n#\n"
 
-    rand = Rand(os.path.join(os.getcwd(), config))
-    display_limit = min(1000, displays)
-    rom_limit = min(100000, roms)
-    display_names = [f"Display{i}" for i in range(0, display_limit)]
-    emulator_names = [f"Emulator{i}" for i in range(0, display_limit)]
+    # files are added to sharded archives in output rather than written loose
+    archive = Archive(output, archive_format, shard_size) if archive_format else None
+    if archive:
+        for shard in find_archives(output):
+            os.remove(shard)
+
+    # every random stream derives from the seed, display, rom and asset
+    seed = secrets.token_hex(8) if randomize else seed
+    rand = Rand(os.path.join(os.getcwd(), config), seed, font_cache_path)
+    displays = min(display_limit, displays)
+    roms = min(rom_limit, roms)
+    display_names = [f"Display{i}" for i in range(0, displays)]
+    emulator_names = [emulator_name(i) for i in range(0, displays)]
 
     config = [
-        generate_config(name, emulator_names[i], rand)
+        generate_config(name, emulator_names[i], rand.stream(name))
         for i, name in enumerate(display_names)
     ]
-    with open(os.path.join(config_path, "attract.cfg"), "w") as file:
-        file.write(cfg_header + "".join(config))
-
-    with open(os.path.join(generate_layout_path, "layout.nut"), "w") as file:
-        file.write(cfg_header.replace("#", "//") + generate_layout())
+    write_text(
+        os.path.join(config_path, "attract.cfg"), cfg_header + "".join(config), archive
+    )
+    write_text(
+        os.path.join(generate_layout_path, "layout.nut"),
+        cfg_header.replace("#", "//") + generate_layout(),
+        archive,
+    )
+    if archive:
+        # artwork dirs are only made in output, extracting creates them when empty
+        archive.add_dir(snaps_path)
+        archive.add_dir(wheels_path)
+        archive.close()
 
     args = (
-        rom_limit,
+        roms,
+        config_path,
         emulators_path,
         romlists_path,
         stats_path,
         snaps_path,
         wheels_path,
         cfg_header,
+        write_threads,
+        stage_path,
+    )
+
+    artwork_args = (
+        snaps_path,
+        wheels_path,
         snap,
         wheel,
         basic,
+        encode_threads,
+        encode_queue,
+        rotate_step,
+    )
+    pool_args = (pool_path, asset_pool, link_mode, wheel_titles)
+
+    # workers write profiles here to be merged once complete
+    profile_path = tempfile.mkdtemp() if profile else None
+    worker_args = (
         rand,
-        randomize,
+        archive,
+        profile_path,
+        profile_mode,
+        sprite_variants,
+        sprite_fresh,
     )
 
+    report = MetricsReport()
     if single_thread:
+        init_worker(*worker_args)
         for name in emulator_names:
-            generate_display(name, *args)
+            report.add(*generate_display_task(name, *args))
+        render_tasks, link_tasks = artwork_tasks(
+            displays, roms, 1, artwork_args, *pool_args
+        )
+        for task in render_tasks:
+            report.add(*generate_artwork_task(task))
+        for task in link_tasks:
+            report.add(*link_artwork_task(task))
     else:
-        with mp.Pool() as pool:
-            pool.starmap(
-                generate_display,
+        with mp.Pool(initializer=init_worker, initargs=worker_args) as pool:
+            # displays first, then spread artwork over every worker by rom
+            for worker, display_metrics in pool.starmap(
+                generate_display_task,
                 ((name, *args) for name in emulator_names),
+            ):
+                report.add(worker, display_metrics)
+            render_tasks, link_tasks = artwork_tasks(
+                displays, roms, os.cpu_count() or 1, artwork_args, *pool_args
             )
-
-    print(
-        f"Generated {display_limit * rom_limit} roms in {((timer() - start_time) * 1000):.3f} ms"
-    )
+            for worker, artwork_metrics in pool.imap_unordered(
+                generate_artwork_task, render_tasks
+            ):
+                report.add(worker, artwork_metrics)
+
+            # pooled assets exist once every render completes
+            for worker, link_metrics in pool.imap_unordered(
+                link_artwork_task, link_tasks
+            ):
+                report.add(worker, link_metrics)
+
+            # workers exit normally, running finalizers
+            pool.close()
+            pool.join()
+
+    if archive:
+        archive.close()
+
+    # clears the line
+    print("\033[K", end="\r", flush=True)
+
+    report.seconds = timer() - start
+    print(report)
+    if metrics_path:
+        report.write(metrics_path)
+    if profile_path:
+        merge_profiles(profile_path, profile)
+        shutil.rmtree(profile_path, ignore_errors=True)
+    print(f"Generated {displays * roms} roms in {(report.seconds * 1000):.3f} ms")
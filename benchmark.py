@@ -0,0 +1,70 @@
+if __name__ == "__main__":
+    import sys
+    from optparse import OptionParser
+
+    version = "Generate-Plus 0.0.1"
+    parser = OptionParser(
+        description=f"{version} benchmarks the rendering and metadata primitives.",
+        version=version,
+    )
+
+    parser.add_option(
+        "-c",
+        "--case",
+        type=str,
+        action="append",
+        help="case to run, repeat for several, default all",
+    )
+    parser.add_option(
+        "-n",
+        "--repeat",
+        type=int,
+        default=10,
+        help="number of timed runs per case",
+    )
+    parser.add_option(
+        "-o",
+        "--output",
+        type=str,
+        help="write results as json to path",
+    )
+    parser.add_option(
+        "-b",
+        "--baseline",
+        type=str,
+        help="compare results against baseline json",
+    )
+    parser.add_option(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown ratio over baseline treated as a regression",
+    )
+    parser.add_option(
+        "--config",
+        type=str,
+        default="data/json/generate.json",
+        help="config json for generator",
+    )
+
+    args, other = parser.parse_args()
+
+    from app.benchmark import benchmark, CASES
+
+    unknown = [c for c in args.case or [] if c not in CASES]
+    if unknown:
+        print(
+            f"ERROR: Unknown case {', '.join(unknown)}, use one of {', '.join(CASES)}"
+        )
+        sys.exit(1)
+
+    passed = benchmark(
+        config=args.config,
+        cases=args.case,
+        repeat=args.repeat,
+        output=args.output,
+        baseline=args.baseline,
+        threshold=args.threshold,
+    )
+    sys.exit(0 if passed else 1)
@@ -35,6 +35,18 @@ if __name__ == "__main__":
         default=100,
         help="number of roms to generate",
     )
+    parser.add_option(
+        "--display-limit",
+        type=int,
+        default=1000,
+        help="maximum number of displays",
+    )
+    parser.add_option(
+        "--rom-limit",
+        type=int,
+        default=100000,
+        help="maximum number of roms per display",
+    )
     parser.add_option(
         "-w",
         "--wheel",
@@ -60,6 +72,11 @@ if __name__ == "__main__":
         default="data/json/generate.json",
         help="config json for generator",
     )
+    parser.add_option(
+        "--font-cache",
+        type=str,
+        help="path for the font catalog and extracted fonts, default in temp",
+    )
     parser.add_option(
         "-f",
         "--force",
@@ -72,12 +89,122 @@ if __name__ == "__main__":
         action="store_true",
         help="single-thread mode",
     )
+    parser.add_option(
+        "--write-threads",
+        type=int,
+        default=4,
+        help="threads per worker writing small files",
+    )
+    parser.add_option(
+        "--stage",
+        type=str,
+        help="stage small files in path (tmpfs) then move to output",
+    )
+    parser.add_option(
+        "--encode-threads",
+        type=int,
+        default=2,
+        help="threads per worker encoding images",
+    )
+    parser.add_option(
+        "--encode-queue",
+        type=int,
+        default=4,
+        help="images per worker waiting to be encoded",
+    )
+    parser.add_option(
+        "--rotate-step",
+        type=float,
+        default=0,
+        help="round sprite rotations to step degrees, 0 for exact",
+    )
+    parser.add_option(
+        "--metrics",
+        type=str,
+        help="write run metrics as json to path",
+    )
+    parser.add_option(
+        "--profile",
+        type=str,
+        help="profile every worker, merged into a stats file at path",
+    )
+    parser.add_option(
+        "--profile-mode",
+        type="choice",
+        choices=["cprofile", "sample"],
+        default="cprofile",
+        help="cprofile for pstats, or sample for low overhead collapsed stacks",
+    )
+    parser.add_option(
+        "--archive",
+        type="choice",
+        choices=["tar", "zip"],
+        help="write output into sharded tar or zip archives",
+    )
+    parser.add_option(
+        "--shard-size",
+        type=int,
+        default=1024,
+        help="size in MB at which a new archive shard is started",
+    )
+    parser.add_option(
+        "--extract",
+        type=str,
+        help="extract archive shards from path into output",
+    )
+    parser.add_option(
+        "--asset-pool",
+        type=int,
+        default=0,
+        help="render this many unique images and link every other rom to them",
+    )
+    parser.add_option(
+        "--link",
+        type="choice",
+        choices=["hard", "sym", "copy"],
+        default="hard",
+        help="link pooled images as hard links, symlinks or copies",
+    )
+    parser.add_option(
+        "--wheel-titles",
+        action="store_true",
+        help="pool wheels by title so each shows its rom title",
+    )
+    parser.add_option(
+        "--sprite-variants",
+        type=int,
+        default=0,
+        help="reuse up to this many variants of each snap sprite, 0 for always new",
+    )
+    parser.add_option(
+        "--sprite-fresh",
+        type=float,
+        default=0.25,
+        help="fraction of pooled sprites still created new",
+    )
+    parser.add_option(
+        "--dry-run",
+        action="store_true",
+        help="estimate disk, time and memory from a small sample, without output",
+    )
+    parser.add_option(
+        "--sample",
+        type=int,
+        default=10,
+        help="number of roms to render artwork for when estimating",
+    )
     parser.add_option(
         "-z",
         "--randomize",
         action="store_true",
         help="randomize results",
     )
+    parser.add_option(
+        "--seed",
+        type=str,
+        default="",
+        help="seed for results, ignored when randomized",
+    )
 
     args, other = parser.parse_args()
 
@@ -91,6 +218,44 @@ if __name__ == "__main__":
 
         args.output = os.path.realpath(os.path.join(os.getcwd(), args.output))
 
+        if args.extract:
+            from tools.archive import extract_archives
+
+            count = extract_archives(args.extract, args.output)
+            print(f"Extracted {count} archive shards into {args.output}")
+            sys.exit(0)
+
+        if args.dry_run:
+            from app.estimate import estimate
+
+            result = estimate(
+                output=args.output,
+                config=args.config,
+                font_cache_path=args.font_cache,
+                displays=args.displays,
+                roms=args.roms,
+                single_thread=args.single_thread,
+                snap=args.snap,
+                wheel=args.wheel,
+                basic=args.basic,
+                randomize=args.randomize,
+                seed=args.seed,
+                display_limit=args.display_limit,
+                rom_limit=args.rom_limit,
+                rotate_step=args.rotate_step,
+                asset_pool=args.asset_pool,
+                link_mode=args.link,
+                wheel_titles=args.wheel_titles,
+                sample=args.sample,
+                sprite_variants=args.sprite_variants,
+                sprite_fresh=args.sprite_fresh,
+            )
+            print(result)
+            if result.disk > result.available:
+                print("ERROR: Not enough disk space")
+                sys.exit(1)
+            sys.exit(0)
+
         if os.path.isdir(args.output):
             files = next(os.walk(args.output), ([], [], []))[2]
             apps = ["attract.exe", "attractplus.exe", "attract.bin", "attractplus.bin"]
@@ -102,12 +267,22 @@ if __name__ == "__main__":
                 print("ERROR: Output path exists, use --force to overwrite")
                 sys.exit(1)
 
+        if args.asset_pool and args.archive:
+            print("ERROR: Cannot link pooled assets in archives, remove --asset-pool")
+            sys.exit(1)
+
         # Guestimate required space
         available = shutil.disk_usage(os.path.dirname(args.output))[2]
-        total_roms = args.displays * args.roms
-        req_conf = 900 + (args.displays * 1250) + (total_roms * 165)
-        req_snap = (total_roms * 57000) if args.snap else 0
-        req_wheel = (total_roms * 51000) if args.wheel else 0
+        displays = min(args.displays, args.display_limit)
+        total_roms = displays * min(args.roms, args.rom_limit)
+        req_conf = 900 + (displays * 1250) + (total_roms * 165)
+        pooled = total_roms
+        if args.asset_pool and args.link != "copy":
+            pooled = min(total_roms, args.asset_pool)
+        req_snap = (pooled * 57000) if args.snap else 0
+        req_wheel = (pooled * 51000) if args.wheel else 0
+        if args.wheel and args.wheel_titles:
+            req_wheel = total_roms * 51000
         required = req_conf + req_snap + req_wheel
         if required > available:
             print(f"ERROR: Not enough disk space, require {required} MB")
@@ -118,6 +293,7 @@ if __name__ == "__main__":
         generate(
             output=args.output,
             config=args.config,
+            font_cache_path=args.font_cache,
             displays=args.displays,
             roms=args.roms,
             snap=args.snap,
@@ -126,4 +302,22 @@ if __name__ == "__main__":
             single_thread=args.single_thread,
             version=version,
             randomize=args.randomize,
+            seed=args.seed,
+            write_threads=args.write_threads,
+            stage_path=args.stage,
+            encode_threads=args.encode_threads,
+            encode_queue=args.encode_queue,
+            display_limit=args.display_limit,
+            rom_limit=args.rom_limit,
+            rotate_step=args.rotate_step,
+            metrics_path=args.metrics,
+            profile=args.profile,
+            profile_mode=args.profile_mode,
+            archive_format=args.archive,
+            shard_size=args.shard_size << 20,
+            asset_pool=args.asset_pool,
+            link_mode=args.link,
+            wheel_titles=args.wheel_titles,
+            sprite_variants=args.sprite_variants,
+            sprite_fresh=args.sprite_fresh,
         )
@@ -0,0 +1,136 @@
+import io, os, re, time, tarfile, threading, zipfile
+
+ARCHIVE_FORMATS = ["tar", "zip"]
+ARCHIVE_BUFFER = 1 << 20
+SHARD_PATTERN = re.compile(r"^shard-\d+-\d+\.(tar|zip)$")
+
+# Already compressed, stored as is in zip shards
+STORED_EXTENSIONS = (".png",)
+
+
+class Archive:
+    """Append output files to sharded tar or zip archives
+
+    Each process writes its own shards, named by process id, and starts a new
+    shard once the current one reaches shard_size bytes. Members are named by
+    their path relative to root so extracting restores the normal tree.
+    """
+
+    root: str
+    format: str
+    shard_size: int
+    files: int
+
+    def __init__(self, root: str, format: str = "tar", shard_size: int = 1 << 30):
+        self.root = root
+        self.format = format
+        self.shard_size = shard_size
+        self.files = 0
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__archive = None
+        self.__shard = 0
+
+    def __getstate__(self):
+        return (self.root, self.format, self.shard_size)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def arcname(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def add(self, path: str, data: bytes):
+        """Add data as a member at path"""
+        with self.__lock:
+            self.__open()
+            name = self.arcname(path)
+            if self.format == "zip":
+                self.__archive.writestr(name, data, compress_type=compression(name))
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mode = 0o644
+                info.mtime = time.time()
+                self.__archive.addfile(info, io.BytesIO(data))
+            self.__added()
+
+    def add_file(self, source: str, path: str):
+        """Add file at source as a member at path"""
+        with self.__lock:
+            self.__open()
+            name = self.arcname(path)
+            if self.format == "zip":
+                self.__archive.write(source, name, compress_type=compression(name))
+            else:
+                self.__archive.add(source, name, recursive=False)
+            self.__added()
+
+    def add_dir(self, path: str):
+        """Add a directory member at path, so extracting creates it when empty"""
+        with self.__lock:
+            self.__open()
+            name = self.arcname(path)
+            if self.format == "zip":
+                self.__archive.mkdir(name)
+            else:
+                info = tarfile.TarInfo(name)
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                info.mtime = time.time()
+                self.__archive.addfile(info)
+
+    def close(self):
+        """Complete the current shard"""
+        with self.__lock:
+            self.__close()
+
+    def __open(self):
+        if self.__archive:
+            return
+        name = f"shard-{os.getpid()}-{self.__shard}.{self.format}"
+        self.__shard += 1
+        self.__file = open(
+            os.path.join(self.root, name), "wb", buffering=ARCHIVE_BUFFER
+        )
+        if self.format == "zip":
+            self.__archive = zipfile.ZipFile(self.__file, "w")
+        else:
+            self.__archive = tarfile.open(fileobj=self.__file, mode="w")
+
+    def __added(self):
+        self.files += 1
+        if self.__file.tell() >= self.shard_size:
+            self.__close()
+
+    def __close(self):
+        if self.__archive:
+            self.__archive.close()
+            self.__file.close()
+            self.__archive = None
+            self.__file = None
+
+
+def compression(name: str) -> int:
+    if name.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def find_archives(path: str) -> list[str]:
+    """Return paths of shards in path"""
+    names = sorted(n for n in os.listdir(path) if SHARD_PATTERN.match(n))
+    return [os.path.join(path, n) for n in names]
+
+
+def extract_archives(path: str, output: str) -> int:
+    """Extract every shard in path into output, return number of shards"""
+    shards = find_archives(path)
+    for shard in shards:
+        if shard.endswith(".zip"):
+            with zipfile.ZipFile(shard) as archive:
+                archive.extractall(output)
+        else:
+            with tarfile.open(shard) as archive:
+                archive.extractall(output, filter="data")
+    return len(shards)
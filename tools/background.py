@@ -1,39 +1,96 @@
 import numpy as np
-from PIL import Image
-from random import randint, choice, random
+from random import Random
 from pyfastnoiselite.pyfastnoiselite import FastNoiseLite, NoiseType, FractalType
 from tools.utils import shuffle_list, roll
 from tools.sprite import create_star
-from tools.draw import palettize
+from tools.canvas import Canvas, premultiply
+
+
+def apart(pos: np.ndarray, reach: int) -> np.ndarray:
+    """Return mask of positions at least reach from every other position"""
+    order = np.argsort(pos)
+    near = np.diff(pos[order]) < reach
+    result = np.empty(len(pos), bool)
+    result[order] = ~(np.append(near, False) | np.insert(near, 0, False))
+    return result
 
 
 def draw_starfield(
-    img: Image.Image,
+    img: Canvas,
     count: int,
     size: tuple[int, int],
     col1: list,
     col2: list,
     col3: list,
+    rng: Random,
 ):
     """Draw random stars"""
-    height = size[1]
-    star = np.array(create_star(size, col1, col2, col3))
-    for i in range(count):
-        x = randint(0, img.width)
-        y = randint(-height, img.height)
-        sa = star.copy()
-        sa[..., 3] = random() * sa[..., 3]  # Random alpha
-        s = Image.fromarray(sa)
-        img.alpha_composite(s, (x, y))
-
-
-def draw_landscape(img: Image.Image, show_space: bool = False):
+    if not count:
+        return
+    sw, sh = size
+    star = premultiply(create_star(size, col1, col2, col3))
+
+    # stars lie whole across the width, so each star row is sw neighbouring pixels
+    gen = np.random.default_rng(rng.getrandbits(128))
+    x = gen.integers(0, img.width - sw, count, endpoint=True)
+    y = gen.integers(-sh, img.height, count, endpoint=True)
+    alpha = gen.random(count, np.float32)
+
+    # stars apart from all others in x or y go in any batch, the rest one batch
+    # after every earlier star they overlap, so no batch blends a pixel twice
+    batch = np.zeros(count, np.intp)
+    near = np.flatnonzero(~(apart(x, sw) | apart(y, sh)))
+    nx = x[near]
+    ny = y[near]
+    overlap = np.tril((abs(nx[:, None] - nx) < sw) & (abs(ny[:, None] - ny) < sh), -1)
+    level = np.zeros(len(near), np.intp)
+    while overlap.any():
+        after = np.where(overlap, level + 1, 0).max(1)
+        if (after == level).all():
+            break
+        level = after
+    batch[near] = level
+
+    # star rows inside the frame, by star and row within the star
+    rows = y[:, None] + np.arange(sh)
+    stars, star_rows = np.nonzero((rows >= 0) & (rows < img.height))
+    starts = rows[stars, star_rows] * img.width + x[stars]
+
+    # each batch of stars is one layer, gathered from the frame as whole pixels,
+    # blended at once and put back
+    pixels = img.pixels.view(np.complex128).reshape(-1)
+    for n in range(batch.max() + 1):
+        layer = batch[stars] == n
+        at = starts[layer, None] + np.arange(sw)
+        src = star[star_rows[layer]]
+        src *= np.repeat(alpha[stars[layer]], sw * 4).reshape(src.shape)
+        region = np.take(pixels, at).view(np.float32).reshape(src.shape)
+        region *= np.repeat(1 - src[..., 3] / 255, 4).reshape(src.shape)
+        region += src
+        np.put(pixels, at, region.view(np.complex128))
+
+
+def noise_field(ngen: FastNoiseLite, rx: np.ndarray, ry: np.ndarray) -> np.ndarray:
+    """Return float32 noise array sampled at every rx, ry grid coord"""
+    coords = np.empty((2, len(ry), len(rx)), dtype=np.float32)
+    coords[0] = rx
+    coords[1] = ry[:, np.newaxis]
+    noise = ngen.gen_from_coords(coords.reshape(2, -1))
+    return noise.reshape(len(ry), len(rx))
+
+
+def noise_index(noise: np.ndarray) -> np.ndarray:
+    """Return palette index for every noise value in -1 to 1"""
+    return np.uint8((noise + 1) * 127.5)
+
+
+def draw_landscape(img: Canvas, rng: Random, show_space: bool = False):
     """Draw noise based landscape / nebula"""
     size = (img.width, img.height)
 
     # noise coarse
     ngen1 = FastNoiseLite(0)
-    ngen1.noise_type = choice(
+    ngen1.noise_type = rng.choice(
         [
             NoiseType.NoiseType_OpenSimplex2,
             NoiseType.NoiseType_OpenSimplex2S,
@@ -43,15 +100,15 @@ def draw_landscape(img: Image.Image, show_space: bool = False):
             NoiseType.NoiseType_Cellular,
         ]
     )
-    ngen1.fractal_type = choice(
+    ngen1.fractal_type = rng.choice(
         [
             FractalType.FractalType_FBm,
             FractalType.FractalType_PingPong,
         ]
     )
     is_cellular = ngen1.noise_type == NoiseType.NoiseType_Cellular
-    freq = randint(4, 16) if is_cellular else max(0.1, random())
-    ngen1.fractal_octaves = randint(1, 16)
+    freq = rng.randint(4, 16) if is_cellular else max(0.1, rng.random())
+    ngen1.fractal_octaves = rng.randint(1, 16)
     ngen1.frequency = freq / min(*size)
 
     # noise fine
@@ -80,32 +137,32 @@ def draw_landscape(img: Image.Image, show_space: bool = False):
 
     if show_space:
         # space colours
-        space_mode = choice([0, 0, 1, 2, 2])
+        space_mode = rng.choice([0, 0, 1, 2, 2])
         if space_mode == 0:
-            if choice([True, False]):
+            if rng.choice([True, False]):
                 c1 = [v4, v4, v4, 255]  # cloud
-                c2 = [*shuffle_list([v4, choice([v0, v4]), v0]), 0]
-            if choice([True, False]):
-                b2 = shuffle_list([v4, choice([v0, v4]), v0])  # cloud overlay
+                c2 = [*shuffle_list([v4, rng.choice([v0, v4]), v0], rng), 0]
+            if rng.choice([True, False]):
+                b2 = shuffle_list([v4, rng.choice([v0, v4]), v0], rng)  # cloud overlay
                 b2a = [0, 64, 0, 48, 0, 0]
         elif space_mode == 1:
-            c3 = [*shuffle_list([v4, choice([v0, v4]), v0]), 128]  # edges
-            c4 = [*shuffle_list([v4, choice([v0, v4]), v0]), 128]
+            c3 = [*shuffle_list([v4, rng.choice([v0, v4]), v0], rng), 128]  # edges
+            c4 = [*shuffle_list([v4, rng.choice([v0, v4]), v0], rng), 128]
         else:
-            if choice([True, False]):
-                c5 = [*shuffle_list([v2, v0, v4]), 128]  # nebula
-                c6 = [*shuffle_list([v4, choice([v0, v4]), v0]), 0]
-            if choice([True, False]):
-                b6 = shuffle_list([v4, choice([v0, v4]), v0])  # nebula overlay
+            if rng.choice([True, False]):
+                c5 = [*shuffle_list([v2, v0, v4], rng), 128]  # nebula
+                c6 = [*shuffle_list([v4, rng.choice([v0, v4]), v0], rng), 0]
+            if rng.choice([True, False]):
+                b6 = shuffle_list([v4, rng.choice([v0, v4]), v0], rng)  # nebula overlay
                 b6a = [0, 120, 160, 220, 255]
     else:
         # land colours
-        inv1 = choice([True, False])
-        inv2 = choice([True, False])
-        inv3 = choice([True, False])
-        roll1 = randint(0, 2)
-        roll2 = randint(0, 2)
-        roll3 = randint(0, 2)
+        inv1 = rng.choice([True, False])
+        inv2 = rng.choice([True, False])
+        inv3 = rng.choice([True, False])
+        roll1 = rng.randint(0, 2)
+        roll2 = rng.randint(0, 2)
+        roll3 = rng.randint(0, 2)
 
         c1 = [*roll([v0, v0, v1] if not inv1 else [v1, v1, v0], roll1), 255]
         c2 = [*roll([v0, v0, v4] if not inv1 else [v4, v4, v0], roll1), 255]
@@ -161,15 +218,24 @@ def draw_landscape(img: Image.Image, show_space: bool = False):
     )
 
     # generate noise
-    rx = np.linspace(0, size[0], size[0]) + randint(-1048576, 1048576)
-    ry = np.linspace(0, size[1], size[1]) + randint(-1048576, 1048576)
-    backg_noise = np.array([[ngen1.get_noise(x, y) for x in rx] for y in ry])
-    detail_noise = np.array([[ngen2.get_noise(x, y) for x in rx] for y in ry])
-    n3 = detail_noise + 1
-    n4 = (backg_noise - 0.1) * 10
-    inner_noise = n3 * np.clip(n4, 0, 1) - 1
-    outer_noise = n3 * np.clip(-n4, 0, 1) - 1
-
-    img.alpha_composite(palettize(backg_noise, backg_palette))
-    img.alpha_composite(palettize(inner_noise, inner_palette))
-    img.alpha_composite(palettize(outer_noise, outer_palette))
+    rx = np.linspace(0, size[0], size[0]) + rng.randint(-1048576, 1048576)
+    ry = np.linspace(0, size[1], size[1]) + rng.randint(-1048576, 1048576)
+    backg_noise = noise_field(ngen1, rx, ry)
+    detail_noise = noise_field(ngen2, rx, ry)
+
+    # n3 = detail + 1, n4 = (backg - 0.1) * 10, reusing buffers where possible
+    n3 = detail_noise
+    n3 += 1
+    n4 = backg_noise - 0.1
+    n4 *= 10
+    inner_noise = np.clip(n4, 0, 1)
+    inner_noise *= n3
+    inner_noise -= 1
+    outer_noise = np.negative(n4, out=n4)
+    np.clip(outer_noise, 0, 1, out=outer_noise)
+    outer_noise *= n3
+    outer_noise -= 1
+
+    img.composite_palette(noise_index(backg_noise), backg_palette)
+    img.composite_palette(noise_index(inner_noise), inner_palette)
+    img.composite_palette(noise_index(outer_noise), outer_palette)
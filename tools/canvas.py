@@ -0,0 +1,105 @@
+import numpy as np
+from PIL import Image
+
+
+def premultiply(im: Image.Image) -> np.ndarray:
+    """Return RGBA image as float32 pixels with colour premultiplied by alpha"""
+    if im.mode != "RGBA":
+        im = im.convert("RGBA")
+    return np.asarray(im.convert("RGBa")).astype(np.float32)
+
+
+class Canvas:
+    """Frame held as premultiplied float32 RGBA pixels, converted to an image once
+
+    Each item is blended only within its rectangle clipped to the frame, without
+    the crop, composite and paste of Image.alpha_composite. Accepts the same
+    alpha_composite calls, so draw functions work on either.
+    """
+
+    width: int
+    height: int
+    pixels: np.ndarray
+
+    def __init__(self, size: tuple[int, int], color: tuple = (0, 0, 0, 0)):
+        self.width, self.height = size
+        color = [*(c * color[3] / 255 for c in color[:3]), color[3]]
+        self.pixels = np.full((self.height, self.width, 4), color, dtype=np.float32)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return (self.width, self.height)
+
+    def clip(self, dest: tuple[int, int], size: tuple[int, int]) -> tuple:
+        """Return frame and source slices of a rectangle clipped to the frame"""
+        x, y = dest
+        left = max(0, x)
+        top = max(0, y)
+        right = min(self.width, x + size[0])
+        bottom = min(self.height, y + size[1])
+        if left >= right or top >= bottom:
+            return None
+        frame = (slice(top, bottom), slice(left, right))
+        source = (slice(top - y, bottom - y), slice(left - x, right - x))
+        return frame, source
+
+    def blend(self, src: np.ndarray, dest: tuple[int, int] = (0, 0)):
+        """Blend premultiplied src pixels over the frame with top left at dest"""
+        clipped = self.clip(dest, (src.shape[1], src.shape[0]))
+        if not clipped:
+            return
+        region = self.pixels[clipped[0]]
+        src = src[clipped[1]]
+
+        # alpha repeated per channel, broadcasting over 4 channels is far slower
+        alpha = 1 - src[..., 3] / 255
+        region *= np.repeat(alpha, 4, axis=1).reshape(region.shape)
+        region += src
+
+    def blend_color(self, color: tuple, mask: np.ndarray, dest: tuple[int, int]):
+        """Blend color over the frame with mask as alpha and top left at dest"""
+        clipped = self.clip(dest, (mask.shape[1], mask.shape[0]))
+        if not clipped:
+            return
+        region = self.pixels[clipped[0]]
+        alpha = mask[clipped[1]] * np.float32(1 / 255)
+        region *= np.repeat(1 - alpha, 4, axis=1).reshape(region.shape)
+        region[..., 3] += alpha * 255
+        for i in range(3):
+            if color[i]:
+                region[..., i] += alpha * color[i]
+
+    def alpha_composite(
+        self, im: Image.Image, dest: tuple[int, int] = (0, 0), source: tuple = (0, 0)
+    ):
+        """Composite im over the frame, as Image.alpha_composite"""
+        if len(source) == 2:
+            source = (*source, *im.size)
+        if source != (0, 0, *im.size):
+            im = im.crop(source)
+        self.blend(premultiply(im), dest)
+
+    def composite_palette(self, indexes: np.ndarray, palette: np.ndarray):
+        """Composite a full frame layer of palette indexes over the frame"""
+        colors = palette.astype(np.float32)
+        colors[:, :3] *= colors[:, 3:] / 255
+        alpha = 1 - colors[:, 3:] / 255
+        if alpha.any():
+            np.multiply(self.pixels, np.take(alpha, indexes, axis=0), out=self.pixels)
+            np.add(self.pixels, np.take(colors, indexes, axis=0), out=self.pixels)
+        else:
+            np.take(colors, indexes, axis=0, out=self.pixels)
+
+    def image(self) -> Image.Image:
+        """Return frame as an RGBA image"""
+        alpha = self.pixels[..., 3:]
+        if alpha.min() >= 254.5:
+            # opaque, premultiplied colour is already the colour
+            pixels = self.pixels + 0.5
+        else:
+            scale = np.divide(255, alpha, out=np.zeros_like(alpha), where=alpha > 0)
+            pixels = self.pixels * scale
+            pixels[..., 3:] = alpha
+            pixels += 0.5
+        np.clip(pixels, 0, 255, out=pixels)
+        return Image.fromarray(pixels.astype(np.uint8))
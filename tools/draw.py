@@ -1,7 +1,16 @@
-from PIL import Image, ImageDraw, ImageFont
+import math
+from collections import namedtuple
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 from tools.utils import zindex_coords, create_arc
+from tools.font import font_cache
+from tools.canvas import Canvas
 import numpy as np
 
+TextMask = namedtuple("TextMask", ["bbox", "fill", "stroke"])
+
+# Pixels between lines of multiline text at the reference font size
+LINE_SPACING = 4
+
 
 def create_gradient(size: tuple[int, int], col1: list, col2: list) -> Image.Image:
     """Return image containing gradient"""
@@ -13,13 +22,8 @@ def create_gradient(size: tuple[int, int], col1: list, col2: list) -> Image.Imag
     )
 
 
-def palettize(noise: np.ndarray, palette: np.ndarray):
-    """Apply palette to array of indexes"""
-    return Image.fromarray(palette[np.uint8((noise + 1) * 127.5)])
-
-
 def draw_stock(
-    img: Image.Image,
+    img: Image.Image | Canvas,
     *,
     ship: Image.Image,
     lives: int,
@@ -38,7 +42,7 @@ def draw_stock(
 
 
 def draw_score(
-    img: Image.Image,
+    img: Image.Image | Canvas,
     *,
     font: ImageFont,
     pos: tuple[int, int],
@@ -50,29 +54,55 @@ def draw_score(
     score_pad = f"{score}".rjust(8, "0")
     text = f"{player}\n{score_pad}"
     anchor = "ra" if align == "right" else "ma" if align == "center" else "la"
-    ImageDraw.Draw(img).text(
-        xy=(pos[0] + 1, pos[1] + 1),
-        text=text,
-        anchor=anchor,
-        align=align,
-        font=font,
-        fill=(0, 0, 0),
+
+    # coverage drawn once, composited offset in black for the shadow then white
+    bbox = ImageDraw.Draw(Image.new(mode="L", size=(1, 1))).textbbox(
+        xy=pos, text=text, anchor=anchor, align=align, font=font
     )
-    ImageDraw.Draw(img).text(
-        xy=pos,
+    left, top = math.floor(bbox[0]), math.floor(bbox[1])
+    size = (math.ceil(bbox[2]) - left, math.ceil(bbox[3]) - top)
+    mask = Image.new("L", size)
+    ImageDraw.Draw(mask).text(
+        xy=(pos[0] - left, pos[1] - top),
         text=text,
         anchor=anchor,
         align=align,
         font=font,
-        fill=(255, 255, 255),
+        fill=255,
     )
+    for color, offset in (((0, 0, 0), 1), ((255, 255, 255), 0)):
+        layer = Image.new("RGBA", size, color)
+        layer.putalpha(mask)
+        img.alpha_composite(layer, (left + offset, top + offset))
+
+
+class RotatedSprite:
+    """Sprite with rotations cached by angle, rounded to step degrees if given"""
+
+    img: Image.Image
+    step: float
+    cache: dict
+
+    def __init__(self, img: Image.Image, step: float = 0):
+        self.img = img
+        self.step = step
+        self.cache = {}
+
+    def rotate(self, angle: float) -> Image.Image:
+        if self.step:
+            angle = round(angle / self.step) * self.step
+        if angle not in self.cache:
+            self.cache[angle] = self.img.rotate(
+                angle, expand=True, resample=Image.Resampling.BILINEAR
+            )
+        return self.cache[angle]
 
 
 def draw_bullet_spread(
-    img: Image.Image,
+    img: Image.Image | Canvas,
     *,
     pos: tuple,
-    bullet: Image.Image,
+    bullet: Image.Image | RotatedSprite,
     direction: int = 90,
     arc: float = 0,
     distance: float = 40,
@@ -83,6 +113,10 @@ def draw_bullet_spread(
     increment: bool = False,
 ):
     """Draw bullets in arc to image"""
+    if isinstance(bullet, Image.Image):
+        bullet = RotatedSprite(bullet)
+
+    items = []
     for r in range(rows):
         odd = r % 2
         alt = alternate and odd
@@ -99,110 +133,200 @@ def draw_bullet_spread(
                 increment=distance if increment else 0,
             )
         ):
-            b = bullet.rotate(a, expand=True, resample=Image.Resampling.BILINEAR)
-            img.alpha_composite(b, (int(x - b.width / 2), int(y - b.height / 2)))
+            b = bullet.rotate(a)
+            items.append((b, int(x - b.width / 2), int(y - b.height / 2)))
+    if not items:
+        return
 
+    # bullets drawn in order on a single layer covering the spread
+    left = min(x for b, x, y in items)
+    top = min(y for b, x, y in items)
+    right = max(x + b.width for b, x, y in items)
+    bottom = max(y + b.height for b, x, y in items)
+    layer = Image.new("RGBA", (right - left, bottom - top))
+    for b, x, y in items:
+        layer.alpha_composite(b, (x - left, y - top))
+    img.alpha_composite(layer, (left, top))
 
-def draw_item(img: Image.Image, *, item: Image.Image, pos: tuple[int, int]):
+
+def draw_item(img: Image.Image | Canvas, *, item: Image.Image, pos: tuple[int, int]):
     """Draw item to img"""
     img.alpha_composite(
         item, (int(pos[0] - item.width / 2), int(pos[1] - item.height / 2))
     )
 
 
-def draw_item_shadow(
-    img: Image.Image,
-    *,
-    item: Image.Image,
-    pos: tuple[int, int],
-    shadow_color: tuple,
-    shadow_pos: tuple[int, int],
-    shadow_scale: float,
-):
-    """Draw item with shadow to img"""
-    size = (int(item.width * shadow_scale), int(item.height * shadow_scale))
-    shadow = Image.new("RGBA", size)
-    shadow.paste(
-        Image.new("RGBA", size, color=shadow_color),
-        mask=item.getchannel("A").resize(size, resample=Image.Resampling.NEAREST),
-    )
-    draw_item(img, item=shadow, pos=(pos[0] + shadow_pos[0], pos[1] + shadow_pos[1]))
-    draw_item(img, item=item, pos=pos)
+class ShadowLayer:
+    """Items drawn over one shared shadow, composited once below them all
 
+    Every item casts a shadow of its alpha scaled by scale and offset by pos, in
+    the same color. Shadow alpha builds up in one buffer as if composited one at
+    a time, and nothing is collected if color is fully transparent.
+    """
 
-def draw_gradient_text(
-    img: Image.Image,
-    *,
-    text: str,
-    font: ImageFont.FreeTypeFont,
-    stroke: int,
-    stroke_color: list,
-    pad: list,
-    stretch: bool = False,
-    col1: list,
-    col2: list,
-):
-    """Draw text with gradient to image"""
+    color: tuple
+    pos: tuple[int, int]
+    scale: float
+    items: list[tuple[Image.Image, tuple[int, int]]]
+    alpha: Image.Image
+    bounds: tuple[int, int, int, int]
+
+    def __init__(
+        self, size: tuple[int, int], color: tuple, pos: tuple[int, int], scale: float
+    ):
+        self.color = color
+        self.pos = pos
+        self.scale = scale
+        self.items = []
+        self.alpha = Image.new("L", size) if color[3] else None
+        self.bounds = (*size, 0, 0)
+
+    def add(self, item: Image.Image, pos: tuple[int, int]):
+        """Add item centred at pos, casting its shadow"""
+        self.items.append((item, pos))
+        if not self.alpha:
+            return
+
+        size = (int(item.width * self.scale), int(item.height * self.scale))
+        x = int(pos[0] + self.pos[0] - size[0] / 2)
+        y = int(pos[1] + self.pos[1] - size[1] / 2)
+        mask = ImageChops.multiply(
+            item.getchannel("A").resize(size, resample=Image.Resampling.NEAREST),
+            Image.new("L", size, self.color[3]),
+        )
 
-    # Get text bounding box
-    txt_img = Image.new(mode="RGBA", size=(1, 1))
-    txt_bbox = ImageDraw.Draw(txt_img).textbbox(
+        # pasting opaque through each shadow alpha builds up as composites would
+        self.alpha.paste(255, (x, y, x + size[0], y + size[1]), mask)
+        self.bounds = (
+            min(self.bounds[0], x),
+            min(self.bounds[1], y),
+            max(self.bounds[2], x + size[0]),
+            max(self.bounds[3], y + size[1]),
+        )
+
+    def draw(self, img: Canvas):
+        """Composite shadow, then every item over it in order"""
+        left, top, right, bottom = self.bounds
+        if self.alpha and left < right and top < bottom:
+            mask = np.asarray(self.alpha.crop(self.bounds))
+            img.blend_color(self.color[:3], mask, (left, top))
+        for item, pos in self.items:
+            draw_item(img, item=item, pos=pos)
+
+
+def text_bbox(
+    font: ImageFont.FreeTypeFont,
+    text: str,
+    stroke: int = 0,
+    spacing: int = LINE_SPACING,
+) -> tuple[int, int, int, int]:
+    """Return bounding box of text drawn at origin"""
+    return ImageDraw.Draw(Image.new(mode="L", size=(1, 1))).textbbox(
         xy=(0, 0),
         text=text,
         font=font,
+        spacing=spacing,
         stroke_width=stroke,
     )
 
-    # Find scale to fit text inside image
-    iw = img.width
-    ih = img.height
+
+def create_text_mask(
+    font: ImageFont.FreeTypeFont,
+    text: str,
+    stroke: int,
+    spacing: int = LINE_SPACING,
+) -> TextMask:
+    """Return text bounding box with fill and stroke coverage masks"""
+    txt_bbox = text_bbox(font, text, stroke, spacing)
+
     space = 1 + stroke
     w = txt_bbox[2] - txt_bbox[0] + space * 2
     h = txt_bbox[3] - txt_bbox[1] + space * 2
-    inner_w = iw - (pad[0] - space) * 2
-    inner_h = ih - (pad[1] - space) * 2
     txt_xy = (-txt_bbox[0] + space, -txt_bbox[1] + space)
 
-    if stretch:
-        w2 = inner_w
-        h2 = inner_h
-    else:
-        scale_x = inner_w / w
-        scale_y = inner_h / h
-        txt_ratio = w / h
-        inner_ratio = inner_w / inner_h
-        scale = scale_x if txt_ratio > inner_ratio else scale_y
-        w2 = int(w * scale)
-        h2 = int(h * scale)
-
-    # Text fill
+    # Text fill, with stroke drawn first so the fill matches its position
     txt_fill = Image.new(mode="L", size=(w, h))
     ImageDraw.Draw(txt_fill).text(
         xy=txt_xy,
         text=text,
         font=font,
+        spacing=spacing,
         align="center",
         stroke_width=stroke,
         fill=(255),
         stroke_fill=(0),
     )
 
-    # Text stroke
-    txt_stroke = Image.new(mode="RGBA", size=(w, h), color=(0, 0, 0, 0))
+    # Text stroke, with fill cut out
+    txt_stroke = Image.new(mode="L", size=(w, h))
     ImageDraw.Draw(txt_stroke).text(
         xy=txt_xy,
         text=text,
         font=font,
+        spacing=spacing,
         align="center",
         stroke_width=stroke,
-        fill=(0, 0, 0, 0),
-        stroke_fill=tuple(stroke_color),
+        fill=(0),
+        stroke_fill=(255),
     )
+    return TextMask(txt_bbox, txt_fill, txt_stroke)
+
+
+def draw_gradient_text(
+    img: Image.Image,
+    *,
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    stroke: int,
+    stroke_color: list,
+    pad: list,
+    stretch: bool = False,
+    col1: list,
+    col2: list,
+):
+    """Draw text with gradient to image, rasterized at the size it is shown"""
+    iw = img.width
+    ih = img.height
+    space = 1 + stroke
+    inner_w = iw - (pad[0] - space) * 2
+    inner_h = ih - (pad[1] - space) * 2
+
+    # Layout - text scales with font size, so fit it using metrics at given size,
+    # leaving room for stroke and space either side which do not scale
+    bbox = text_bbox(font, text)
+    margin = (stroke + space) * 2
+    scale_x = (inner_w - margin) / max(1, bbox[2] - bbox[0])
+    scale_y = (inner_h - margin) / max(1, bbox[3] - bbox[1])
+    scale = scale_y if stretch else min(scale_x, scale_y)
+
+    # Hinting may round glyphs up, so step down until stroked text fits
+    size = max(1, int(font.size * scale))
+    while True:
+        sized = font_cache.get(font.path, size)
+        spacing = round(LINE_SPACING * size / font.size)
+        bbox = text_bbox(sized, text, stroke, spacing)
+        w = bbox[2] - bbox[0] + space * 2
+        h = bbox[3] - bbox[1] + space * 2
+        if stretch or size == 1 or (w <= inner_w and h <= inner_h):
+            break
+        # by as much as the glyphs overflow, as stroke and space do not scale
+        fit_w = (inner_w - margin) / max(1, w - margin)
+        fit_h = (inner_h - margin) / max(1, h - margin)
+        size = max(1, min(size - 1, int(size * min(fit_w, fit_h))))
+
+    mask = create_text_mask(sized, text, stroke, spacing)
+    w2, h2 = (inner_w, inner_h) if stretch else (w, h)
+
+    # Text stroke, coloured with fill cleared as if drawn over it
+    txt_stroke = Image.new(mode="RGBA", size=(w, h), color=tuple(stroke_color))
+    txt_stroke.paste((0, 0, 0, 0), mask=mask.fill)
+    txt_stroke.putalpha(mask.stroke)
 
     # Composite
     txt_img = Image.new(mode="RGB", size=(w, h))
     txt_img.paste(create_gradient((w, h), col1, col2))
-    txt_img.putalpha(txt_fill)
+    txt_img.putalpha(mask.fill)
     txt_img.alpha_composite(txt_stroke)
-    txt_img = txt_img.resize((w2, h2))
+    if stretch:
+        txt_img = txt_img.resize((w2, h2))
     img.alpha_composite(txt_img, (int((iw - w2) / 2), int((ih - h2) / 2)))
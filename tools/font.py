@@ -0,0 +1,174 @@
+import os, json, hashlib, tempfile, zipfile
+from collections import OrderedDict, namedtuple
+from PIL import ImageFont
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+CATALOG_NAME = "fonts.json"
+CATALOG_VERSION = 1
+FONT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "generate-plus", "fonts")
+FONT_EXTENSIONS = (".ttf", ".otf")
+PRELOAD_SIZE = 100
+
+
+class FontCatalog:
+    """Fonts extracted from zips into a cache path, recorded in a catalog file
+
+    Each zip is recorded with its mtime and size, along with the chosen member, its
+    offset and size, and a hash of its content which names the extracted file. A zip
+    is only opened again once it changes. Fonts load from the extracted file, which
+    FreeType maps, so every worker shares its pages.
+    """
+
+    path: str
+    entries: dict[str, dict]
+    changed: bool
+
+    def __init__(self, path: str = FONT_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(os.path.join(path, CATALOG_NAME)) as file:
+                catalog = json.load(file)
+            if catalog.get("version") == CATALOG_VERSION:
+                self.entries = catalog["fonts"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def fonts(self, path: str) -> list[str]:
+        """Return extracted font paths for every zip in path"""
+        names = [f for f in next(os.walk(path), ([], [], []))[2] if f.endswith(".zip")]
+        fonts = [self.font(os.path.join(path, n)) for n in names]
+        return [f for f in fonts if f]
+
+    def font(self, zip_path: str) -> str | None:
+        """Return extracted font path for zip, None if it holds no font"""
+        key = os.path.abspath(zip_path)
+        stat = os.stat(key)
+        entry = self.entries.get(key)
+        if (
+            not entry
+            or entry["mtime"] != stat.st_mtime_ns
+            or entry["size"] != stat.st_size
+        ):
+            entry = self.__extract(key, stat)
+        if not entry["member"]:
+            return None
+
+        # extracted files may have been cleared since the catalog was written
+        font = os.path.join(self.path, entry["file"])
+        if not os.path.isfile(font) or os.path.getsize(font) != entry["length"]:
+            entry = self.__extract(key, stat)
+            font = os.path.join(self.path, entry["file"])
+        return font
+
+    def save(self):
+        """Write catalog if any entry changed, replacing the previous one"""
+        if not self.changed:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        temp = os.path.join(self.path, f"{CATALOG_NAME}.{os.getpid()}")
+        with open(temp, "w") as file:
+            json.dump({"version": CATALOG_VERSION, "fonts": self.entries}, file)
+        os.replace(temp, os.path.join(self.path, CATALOG_NAME))
+        self.changed = False
+
+    def __extract(self, zip_path: str, stat: os.stat_result) -> dict:
+        with zipfile.ZipFile(zip_path) as zip:
+            info = best_font(zip)
+            data = zip.read(info) if info else b""
+
+        digest = hashlib.sha1(data).hexdigest()
+        ext = os.path.splitext(info.filename)[1].lower() if info else ""
+        entry = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "member": info.filename if info else None,
+            "offset": info.header_offset if info else 0,
+            "length": len(data),
+            "hash": digest,
+            "file": f"{digest}{ext}",
+        }
+        if info:
+            # written aside then renamed, so readers never see a partial font
+            os.makedirs(self.path, exist_ok=True)
+            font = os.path.join(self.path, entry["file"])
+            temp = f"{font}.{os.getpid()}"
+            with open(temp, "wb") as file:
+                file.write(data)
+            os.replace(temp, font)
+
+        self.entries[zip_path] = entry
+        self.changed = True
+        return entry
+
+
+def best_font(font_zip: zipfile.ZipFile) -> zipfile.ZipInfo | None:
+    """Return font member with the shortest name, usually the regular style"""
+    best = None
+    for info in font_zip.infolist():
+        if info.filename.lower().endswith(FONT_EXTENSIONS):
+            if not best or len(info.filename) < len(best.filename):
+                best = info
+    return best
+
+
+class FontCache:
+    """Bounded cache of truetype fonts keyed by (font path, size)
+
+    Each font file is loaded once and kept, every other size is a variant of it.
+    """
+
+    maxsize: int
+    hits: int
+    misses: int
+    fonts: OrderedDict
+    loaded: dict[str, ImageFont.FreeTypeFont]
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.fonts = OrderedDict()
+        self.loaded = {}
+
+    def preload(self, fonts: list[str], size: int = PRELOAD_SIZE):
+        """Load every font not loaded yet, so tasks only derive sizes from them"""
+        for font in fonts:
+            if font not in self.loaded:
+                self.loaded[font] = ImageFont.truetype(font, size=size)
+
+    def get(self, font: str, size: int) -> ImageFont.FreeTypeFont:
+        """Return font at size, only loaded from file if not loaded before"""
+        key = (font, size)
+        if key in self.fonts:
+            self.hits += 1
+            self.fonts.move_to_end(key)
+            return self.fonts[key]
+
+        self.misses += 1
+        base = self.loaded.get(font)
+        if not base:
+            item = self.loaded[font] = ImageFont.truetype(font, size=size)
+        elif base.size == size:
+            item = base
+        else:
+            item = base.font_variant(size=size)
+
+        self.fonts[key] = item
+        if len(self.fonts) > self.maxsize:
+            self.fonts.popitem(last=False)
+        return item
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.fonts))
+
+    def cache_clear(self):
+        self.fonts.clear()
+        self.loaded.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Module level so each worker process holds its own cache
+font_cache = FontCache()
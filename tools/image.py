@@ -1,8 +1,10 @@
 import os
-from random import randint, choice, random
-from PIL import Image, ImageFont
+from random import Random
+from PIL import Image
 
 from tools.rand import Rand
+from tools.writer import ImageWriter, save_image
+from tools.metrics import metrics
 from tools.utils import create_arc, shuffle_tuple, shuffle_list, flip_roll
 from tools.sprite import (
     create_flash,
@@ -12,39 +14,59 @@ from tools.sprite import (
     create_boom,
 )
 from tools.background import draw_landscape, draw_starfield
+from tools.canvas import Canvas
 from tools.draw import (
+    RotatedSprite,
     draw_stock,
     draw_score,
     draw_bullet_spread,
     draw_item,
-    draw_item_shadow,
+    ShadowLayer,
     draw_gradient_text,
 )
 
 
-def rand_tf() -> bool:
-    return choice([True, False])
+def rand_tf(rng: Random) -> bool:
+    return rng.choice([True, False])
 
 
-def rand_roll() -> int:
-    return randint(0, 2)
+def rand_roll(rng: Random) -> int:
+    return rng.randint(0, 2)
 
 
-def rand_light_color() -> list:
-    return shuffle_list([255, choice([64, 128, 255]), choice([0, 64, 128])])
+def rand_light_color(rng: Random) -> list:
+    return shuffle_list(
+        [255, rng.choice([64, 128, 255]), rng.choice([0, 64, 128])], rng
+    )
+
+
+def rand_med_color(rng: Random) -> list:
+    return shuffle_list([128, rng.choice([0, 32, 64]), rng.choice([0, 64, 128])], rng)
 
 
-def rand_med_color() -> list:
-    return shuffle_list([128, choice([0, 32, 64]), choice([0, 64, 128])])
+def rand_dark_color(rng: Random) -> list:
+    return shuffle_list([0, rng.choice([0, 16, 32]), rng.choice([0, 16, 32])], rng)
 
 
-def rand_dark_color() -> list:
-    return shuffle_list([0, choice([0, 16, 32]), choice([0, 16, 32])])
+def save(img: Image.Image, path: str, writer: ImageWriter = None, mode: str = None):
+    """Save image, queued on writer if given"""
+    if writer:
+        writer.save(img, path, mode)
+    else:
+        save_image(img, path, mode)
 
 
-def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
+def generate_snap(
+    name: str,
+    basic: bool,
+    snaps_path: str,
+    rand: Rand,
+    writer: ImageWriter = None,
+    rotate_step: float = 0,
+):
+    rng = rand.rng
     w, h = rand.snap_size()
-    img = Image.new(mode="RGBA", size=(w, h), color=(0, 0, 0, 255))
+    img = Canvas((w, h), (0, 0, 0, 255))
 
     v = min(w, h)
     v240 = int(v / 1)
@@ -67,22 +89,22 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
 
     show_overlay = True
     show_ship = True
-    show_wingman = random() < 0.2
-    show_enemy = rand_tf()
-    show_powerup = rand_tf()
-    show_squad = rand_tf()
-    show_boom1 = rand_tf()
-    show_boom2 = rand_tf()
+    show_wingman = rng.random() < 0.2
+    show_enemy = rand_tf(rng)
+    show_powerup = rand_tf(rng)
+    show_squad = rand_tf(rng)
+    show_boom1 = rand_tf(rng)
+    show_boom2 = rand_tf(rng)
     show_starfield = True
-    show_hyperspace = rand_tf()
+    show_hyperspace = rand_tf(rng)
     show_landscape = not basic
-    show_space = rand_tf()
+    show_space = rand_tf(rng)
 
-    boom_flip = rand_tf()
-    boom_roll = rand_roll()
+    boom_flip = rand_tf(rng)
+    boom_roll = rand_roll(rng)
     boom_col1 = flip_roll((255, 0, 0), boom_flip, boom_roll)
     boom_col2 = flip_roll((255, 150, 0), boom_flip, boom_roll)
-    boom_col3 = flip_roll((255, 255, 0), rand_tf(), rand_roll())
+    boom_col3 = flip_roll((255, 255, 0), rand_tf(rng), rand_roll(rng))
     boom_col4 = (255, 255, 255)
 
     ship_width = v30
@@ -91,11 +113,12 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
     wingman_height = v20
 
     shadow_color = (0, 0, 0, 0) if show_space else (0, 0, 0, 64)
-    shadow_pos = (randint(-v10, v10), randint(v10, v20))
+    shadow_pos = (rng.randint(-v10, v10), rng.randint(v10, v20))
     shadow_scale = v10 / shadow_pos[1]
+    shadows = ShadowLayer((w, h), shadow_color, shadow_pos, shadow_scale)
 
-    ship_pos = (w * (0.1 + 0.8 * random()), h * (0.6 + 0.3 * random()))
-    enemy_pos = (w * (0.2 + 0.6 * random()), h * (0.2 + 0.1 * random()))
+    ship_pos = (w * (0.1 + 0.8 * rng.random()), h * (0.6 + 0.3 * rng.random()))
+    enemy_pos = (w * (0.2 + 0.6 * rng.random()), h * (0.2 + 0.1 * rng.random()))
     wingman_offset = (int(ship_width * 1), int(ship_height * 0.15))
     wingman_pos1 = (
         ship_pos[0] + wingman_offset[0],
@@ -106,119 +129,99 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
         ship_pos[1] + wingman_offset[1],
     )
 
+    split = metrics.split("snap")
     if show_starfield:
         draw_starfield(
             img,
-            randint(150, 250),
+            rng.randint(150, 250),
             (v1, v1),
             [255, 255, 255, 128],
             [255, 255, 255, 128],
             [255, 255, 255, 128],
+            rng=rng,
         )
 
     if show_hyperspace:
-        s_hyper = random() < 0.1
-        s_count = 300 if s_hyper else randint(30, 60)
-        s_height = v240 if s_hyper else randint(v10, v30)
+        s_hyper = rng.random() < 0.1
+        s_count = 300 if s_hyper else rng.randint(30, 60)
+        s_height = v240 if s_hyper else rng.randint(v10, v30)
         draw_starfield(
             img,
             s_count,
             (v1, s_height),
-            [*flip_roll((100, 100, 200), rand_tf(), rand_roll()), 128],
-            [*flip_roll((100, 0, 200), rand_tf(), rand_roll()), 128],
-            [*flip_roll((200, 0, 200), rand_tf(), rand_roll()), 0],
+            [*flip_roll((100, 100, 200), rand_tf(rng), rand_roll(rng)), 128],
+            [*flip_roll((100, 0, 200), rand_tf(rng), rand_roll(rng)), 128],
+            [*flip_roll((200, 0, 200), rand_tf(rng), rand_roll(rng)), 0],
+            rng=rng,
         )
 
+    split("starfield")
+
     if show_landscape:
-        draw_landscape(img, show_space)
+        draw_landscape(img, rng, show_space)
+    split("landscape")
 
     if show_enemy:
-        e_flip = rand_tf()
-        e_roll = rand_roll()
+        e_flip = rand_tf(rng)
+        e_roll = rand_roll(rng)
         enemy = create_ship(
             size=(v80, v60),
             body_color=flip_roll((30, 45, 30), e_flip, e_roll),
             pod_color=(220, 0, 0),
             detail_color=flip_roll((60, 80, 60), e_flip, e_roll),
+            rng=rng,
         ).rotate(180, expand=True)
-        draw_item_shadow(
-            img,
-            item=enemy,
-            pos=enemy_pos,
-            shadow_color=shadow_color,
-            shadow_pos=shadow_pos,
-            shadow_scale=shadow_scale,
-        )
+        shadows.add(enemy, enemy_pos)
 
     show_squad = True
     if show_squad:
         squad = create_ship(
             size=(v16, v20),
-            body_color=shuffle_tuple((255, 90, 90)),
+            body_color=shuffle_tuple((255, 90, 90), rng),
             pod_color=(220, 0, 0),
             detail_color=(90, 90, 90),
+            rng=rng,
         )
         squad_coords = create_arc(
-            pos=(w * (0.4 + 0.2 * random()), h * (0.4 + 0.2 * random())),
-            direction=randint(0, 360),
-            arc=randint(50, 90),
-            distance=randint(v80, v120),
-            count=randint(1, 4),
+            pos=(w * (0.4 + 0.2 * rng.random()), h * (0.4 + 0.2 * rng.random())),
+            direction=rng.randint(0, 360),
+            arc=rng.randint(50, 90),
+            distance=rng.randint(v80, v120),
+            count=rng.randint(1, 4),
         )
+        squad = RotatedSprite(squad, rotate_step)
         for coord in squad_coords:
-            draw_item_shadow(
-                img,
-                item=squad.rotate(
-                    coord[2] - 90,
-                    expand=True,
-                    resample=Image.Resampling.BILINEAR,
-                ),
-                pos=(coord[0], coord[1]),
-                shadow_color=shadow_color,
-                shadow_pos=shadow_pos,
-                shadow_scale=shadow_scale,
-            )
+            shadows.add(squad.rotate(coord[2] - 90), (coord[0], coord[1]))
 
     if show_powerup:
         powerup = create_powerup(
             size=(v20, v20),
-            sides=randint(3, 8),
-            col1=shuffle_tuple((0, 220, choice([220, 0]))),
+            sides=rng.randint(3, 8),
+            col1=shuffle_tuple((0, 220, rng.choice([220, 0])), rng),
             col2=(220, 220, 220),
         )
-        draw_item_shadow(
-            img,
-            item=powerup,
-            pos=(w * (0.1 + 0.8 * random()), h * (0.2 + 0.6 * random())),
-            shadow_color=shadow_color,
-            shadow_pos=shadow_pos,
-            shadow_scale=shadow_scale,
+        shadows.add(
+            powerup, (w * (0.1 + 0.8 * rng.random()), h * (0.2 + 0.6 * rng.random()))
         )
 
     if show_ship:
-        ship_beam = random() < 0.05
-        ship_bullet_rows = randint(0, 5)
-        ship_bullet_arc = randint(0, 15)
-        ship_bullet_count = randint(1, 5)
-        ship_bullet_distance = randint(v30, v48)
-        ship_bullet_start_dist = randint(v40, v100)
+        ship_beam = rng.random() < 0.05
+        ship_bullet_rows = rng.randint(0, 5)
+        ship_bullet_arc = rng.randint(0, 15)
+        ship_bullet_count = rng.randint(1, 5)
+        ship_bullet_distance = rng.randint(v30, v48)
+        ship_bullet_start_dist = rng.randint(v40, v100)
         ship_bullet_fill = (255, 255, 255)
-        ship_bullet_outline = shuffle_tuple((0, 200, 255))
+        ship_bullet_outline = shuffle_tuple((0, 200, 255), rng)
 
         ship = create_ship(
             size=(ship_width, ship_height),
             body_color=(220, 220, 220),
             pod_color=(0, 220, 220),
             detail_color=(200, 200, 200),
+            rng=rng,
         )
-        draw_item_shadow(
-            img,
-            item=ship,
-            pos=ship_pos,
-            shadow_color=shadow_color,
-            shadow_pos=shadow_pos,
-            shadow_scale=shadow_scale,
-        )
+        shadows.add(ship, ship_pos)
 
         if show_wingman:
             wingman = create_ship(
@@ -226,63 +229,56 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
                 body_color=(220, 220, 220),
                 pod_color=(0, 220, 220),
                 detail_color=(200, 200, 200),
+                rng=rng,
             )
-            draw_item_shadow(
-                img,
-                item=wingman,
-                pos=wingman_pos1,
-                shadow_color=shadow_color,
-                shadow_pos=shadow_pos,
-                shadow_scale=shadow_scale,
-            )
-            draw_item_shadow(
-                img,
-                item=wingman,
-                pos=wingman_pos2,
-                shadow_color=shadow_color,
-                shadow_pos=shadow_pos,
-                shadow_scale=shadow_scale,
-            )
+            shadows.add(wingman, wingman_pos1)
+            shadows.add(wingman, wingman_pos2)
+
+    # every shadow below every item casting one
+    shadows.draw(img)
 
     if show_boom1:
-        boom_size1 = randint(v60, v100)
+        boom_size1 = rng.randint(v60, v100)
         boom1 = create_boom(
             size=(boom_size1, boom_size1),
             col1=boom_col1,
             col2=boom_col2,
             col3=boom_col3,
             col4=boom_col4,
+            rng=rng,
         )
         draw_item(
             img,
             item=boom1,
-            pos=(w * (0.1 + 0.8 * random()), h * (0.1 + 0.8 * random())),
+            pos=(w * (0.1 + 0.8 * rng.random()), h * (0.1 + 0.8 * rng.random())),
         )
 
     if show_boom2:
-        boom_size2 = randint(v30, v60)
+        boom_size2 = rng.randint(v30, v60)
         boom2 = create_boom(
             size=(boom_size2, boom_size2),
             col1=boom_col1,
             col2=boom_col2,
             col3=boom_col3,
             col4=boom_col4,
+            rng=rng,
         )
         draw_item(
             img,
             item=boom2,
-            pos=(w * (0.1 + 0.8 * random()), h * (0.1 + 0.8 * random())),
+            pos=(w * (0.1 + 0.8 * rng.random()), h * (0.1 + 0.8 * rng.random())),
         )
 
     if show_ship:
         if ship_beam:
             ship_bullet = create_bullet(
-                size=(randint(v20, v30), h),
+                size=(rng.randint(v20, v30), h),
                 thickness=v2,
                 radius=v30,
                 fill=ship_bullet_fill,
                 outline=ship_bullet_outline,
                 type="square",
+                rng=rng,
             )
             draw_bullet_spread(
                 img,
@@ -295,12 +291,13 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
             )
             if show_wingman:
                 ship_bullet = create_bullet(
-                    size=(randint(v5, v10), h),
+                    size=(rng.randint(v5, v10), h),
                     thickness=v2,
                     radius=v10,
                     fill=ship_bullet_fill,
                     outline=ship_bullet_outline,
                     type="square",
+                    rng=rng,
                 )
                 draw_bullet_spread(
                     img,
@@ -322,12 +319,14 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
                 )
         else:
             ship_bullet = create_bullet(
-                size=(randint(v8, v10), v20),
+                size=(rng.randint(v8, v10), v20),
                 thickness=v2,
                 radius=v4,
                 fill=ship_bullet_fill,
                 outline=ship_bullet_outline,
+                rng=rng,
             )
+            ship_bullet = RotatedSprite(ship_bullet, rotate_step)
             draw_bullet_spread(
                 img,
                 pos=ship_pos,
@@ -372,6 +371,7 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
                     thickness=v2,
                     fill=ship_bullet_fill,
                     outline=ship_bullet_outline,
+                    rng=rng,
                 )
                 draw_item(
                     img,
@@ -400,27 +400,31 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
                     )
 
     if show_enemy:
-        bullet_flip = rand_tf()
-        bullet_roll = rand_roll()
+        bullet_flip = rand_tf(rng)
+        bullet_roll = rand_roll(rng)
         enemy_bullet = create_bullet(
-            size=(randint(v8, v10), randint(v8, v40)),
+            size=(rng.randint(v8, v10), rng.randint(v8, v40)),
             thickness=v2,
             radius=v4,
-            fill=flip_roll((255, choice([255, 220]), 220), bullet_flip, bullet_roll),
+            fill=flip_roll(
+                (255, rng.choice([255, 220]), 220), bullet_flip, bullet_roll
+            ),
             outline=flip_roll((255, 0, 0), bullet_flip, bullet_roll),
+            rng=rng,
         )
-        if random() < 0.3:
+        enemy_bullet = RotatedSprite(enemy_bullet, rotate_step)
+        if rng.random() < 0.3:
             # spiral
             draw_bullet_spread(
                 img,
                 pos=enemy_pos,
                 bullet=enemy_bullet,
-                direction=randint(0, 360),
+                direction=rng.randint(0, 360),
                 arc=360,
-                distance=randint(v40, v48),
+                distance=rng.randint(v40, v48),
                 count=36,
-                start_dist=randint(v48, v100),
-                rows=randint(0, 4),
+                start_dist=rng.randint(v48, v100),
+                rows=rng.randint(0, 4),
                 increment=True,
             )
         else:
@@ -429,24 +433,26 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
                 img,
                 pos=enemy_pos,
                 bullet=enemy_bullet,
-                direction=randint(250, 290),
-                arc=randint(70, 90),
-                distance=randint(v40, v48),
-                count=randint(5, 9),
-                start_dist=randint(v48, v100),
-                rows=randint(0, 4),
-                alternate=rand_tf(),
+                direction=rng.randint(250, 290),
+                arc=rng.randint(70, 90),
+                distance=rng.randint(v40, v48),
+                count=rng.randint(5, 9),
+                start_dist=rng.randint(v48, v100),
+                rows=rng.randint(0, 4),
+                alternate=rand_tf(rng),
             )
 
+    split("sprites")
+
     if show_overlay:
-        score1 = randint(0, 99999)
-        score2 = randint(0, 99999)
-        highscore = max(score1, score2, randint(0, 99999))
-        font = ImageFont.truetype(font=rand.font_display(), size=v7)
+        score1 = rng.randint(0, 99999)
+        score2 = rng.randint(0, 99999)
+        highscore = max(score1, score2, rng.randint(0, 99999))
+        font = rand.font_display(v7)
         draw_stock(
             img,
             ship=ship,
-            lives=randint(1, 4),
+            lives=rng.randint(1, 4),
             pos=(v5, v5),
             scale=0.25,
         )
@@ -475,10 +481,19 @@ def generate_snap(name: str, basic: bool, snaps_path: str, rand: Rand):
             score=score2,
         )
 
-    img.convert("RGB").save(os.path.join(snaps_path, f"{name}.png"))
+    split("overlay")
+
+    save(img.image(), os.path.join(snaps_path, f"{name}.png"), writer, "RGB")
 
 
-def generate_wheel(name: str, title: str, snaps_path: str, rand: Rand):
+def generate_wheel(
+    name: str,
+    title: str,
+    snaps_path: str,
+    rand: Rand,
+    writer: ImageWriter = None,
+):
+    rng = rand.rng
     size = rand.wheel_size()
     img = Image.new(mode="RGBA", size=size)
 
@@ -494,12 +509,12 @@ def generate_wheel(name: str, title: str, snaps_path: str, rand: Rand):
             text_bg = parts.pop().upper()
         # content long enough the break
         if len(" ".join(parts)) > 12:
-            parts[randint(0, len(parts) - 1)] += "\n"
+            parts[rng.randint(0, len(parts) - 1)] += "\n"
         text = (" ".join(parts)).replace("\n ", "\n")
 
     # common stroke for all words
-    stroke = randint(2, 10)
-    stroke_color = rand_dark_color()
+    stroke = rng.randint(2, 10)
+    stroke_color = rand_dark_color(rng)
     pad = [int(img.height / 20), int(img.height / 20)]
 
     if text_bg:
@@ -507,38 +522,38 @@ def generate_wheel(name: str, title: str, snaps_path: str, rand: Rand):
         draw_gradient_text(
             img=img,
             text=text_bg,
-            font=ImageFont.truetype(font=rand.font_foreground(), size=200),
+            font=rand.font_foreground(200),
             stroke=stroke,
             stroke_color=stroke_color,
             pad=pad,
-            col1=rand_med_color(),
-            col2=rand_med_color(),
+            col1=rand_med_color(rng),
+            col2=rand_med_color(rng),
             stretch=len(text_bg) > 3,
         )
         pad[1] = int(img.height / 4)
-    elif random() > 0.6:
+    elif rng.random() > 0.6:
         # special font as bg
         draw_gradient_text(
             img=img,
             text=rand.fonts_background_char(),
-            font=ImageFont.truetype(font=rand.font_background(), size=200),
+            font=rand.font_background(200),
             stroke=stroke,
             stroke_color=stroke_color,
             pad=pad,
-            col1=rand_med_color(),
-            col2=rand_med_color(),
+            col1=rand_med_color(rng),
+            col2=rand_med_color(rng),
         )
 
     # foreground text
     draw_gradient_text(
         img=img,
         text=text,
-        font=ImageFont.truetype(font=rand.font_foreground(), size=100),
+        font=rand.font_foreground(100),
         stroke=stroke,
         stroke_color=stroke_color,
         pad=pad,
-        col1=rand_light_color(),
-        col2=rand_light_color(),
+        col1=rand_light_color(rng),
+        col2=rand_light_color(rng),
     )
 
-    img.save(os.path.join(snaps_path, f"{name}.png"))
+    save(img, os.path.join(snaps_path, f"{name}.png"), writer)
@@ -0,0 +1,169 @@
+import json
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+# Stages counted towards worker throughput
+BUSY_STAGES = ["display", "artwork", "link"]
+IMAGE_STAGES = ["wheel", "snap"]
+
+
+class Metrics:
+    """Seconds and item counts per stage, and peak bytes held per cache"""
+
+    seconds: dict[str, float]
+    counts: dict[str, int]
+    peaks: dict[str, int]
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self.peaks = {}
+
+    def __add__(self, other: "Metrics") -> "Metrics":
+        result = Metrics()
+        for metrics in (self, other):
+            for stage, seconds in metrics.seconds.items():
+                result.add(stage, seconds, metrics.counts[stage])
+            for name, size in metrics.peaks.items():
+                result.peak(name, size)
+        return result
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        """Add seconds and count to stage"""
+        self.seconds[stage] = self.seconds.get(stage, 0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def peak(self, name: str, size: int):
+        """Record size bytes held by name, keeping the largest"""
+        self.peaks[name] = max(self.peaks.get(name, 0), size)
+
+    @contextmanager
+    def time(self, stage: str, count: int = 1):
+        """Add seconds spent in block to stage"""
+        start = timer()
+        try:
+            yield
+        finally:
+            self.add(stage, timer() - start, count)
+
+    def split(self, prefix: str) -> "Split":
+        return Split(self, prefix)
+
+    def pop(self) -> "Metrics":
+        """Return metrics recorded so far and start again"""
+        result = Metrics()
+        result.seconds, self.seconds = self.seconds, {}
+        result.counts, self.counts = self.counts, {}
+        result.peaks, self.peaks = self.peaks, {}
+        return result
+
+    def busy(self) -> float:
+        return sum(self.seconds.get(stage, 0) for stage in BUSY_STAGES)
+
+    def display(self) -> float:
+        return self.seconds.get("display", 0)
+
+    def roms(self) -> int:
+        return self.counts.get("rom", 0)
+
+    def images(self) -> int:
+        return sum(self.counts.get(stage, 0) for stage in IMAGE_STAGES)
+
+    def files(self) -> int:
+        return self.counts.get("files", 0)
+
+
+class Split:
+    """Add seconds since the previous split to each named stage"""
+
+    metrics: Metrics
+    prefix: str
+    start: float
+
+    def __init__(self, metrics: Metrics, prefix: str):
+        self.metrics = metrics
+        self.prefix = prefix
+        self.start = timer()
+
+    def __call__(self, stage: str):
+        now = timer()
+        self.metrics.add(f"{self.prefix}.{stage}", now - self.start)
+        self.start = now
+
+
+class MetricsReport:
+    """Metrics for a run, totalled and per worker"""
+
+    seconds: float
+    total: Metrics
+    workers: dict[int, Metrics]
+
+    def __init__(self):
+        self.seconds = 0
+        self.total = Metrics()
+        self.workers = {}
+
+    def add(self, worker: int, metrics: Metrics):
+        """Add metrics returned by a task run on worker"""
+        self.total += metrics
+        self.workers[worker] = self.workers.get(worker, Metrics()) + metrics
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": self.seconds,
+            "stages": {
+                stage: {"count": self.total.counts[stage], "seconds": seconds}
+                for stage, seconds in sorted(self.total.seconds.items())
+            },
+            "peaks": {
+                name: sum(m.peaks.get(name, 0) for m in self.workers.values())
+                for name in sorted(self.total.peaks)
+            },
+            "workers": [
+                {
+                    "pid": pid,
+                    "seconds": metrics.busy(),
+                    "roms": metrics.roms(),
+                    "images": metrics.images(),
+                    "files": metrics.files(),
+                    "roms_per_sec": rate(metrics.roms(), metrics.busy()),
+                    "images_per_sec": rate(metrics.images(), metrics.busy()),
+                    "files_per_sec": rate(metrics.files(), metrics.display()),
+                    "peaks": metrics.peaks,
+                }
+                for pid, metrics in sorted(self.workers.items())
+            ],
+        }
+
+    def write(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def __str__(self) -> str:
+        data = self.to_dict()
+        lines = [f"{'Stage':<20}{'Count':>10}{'Total ms':>14}{'Each ms':>12}"]
+        for stage, item in data["stages"].items():
+            ms = item["seconds"] * 1000
+            each = ms / item["count"] if item["count"] else 0
+            lines.append(f"{stage:<20}{item['count']:>10}{ms:>14.3f}{each:>12.3f}")
+        for name, size in data["peaks"].items():
+            lines.append(f"{name:<20}{'peak':>10}{size / (1 << 20):>11.1f} MB")
+        lines.append(
+            f"{'Worker':<20}{'Roms':>10}{'Images':>14}{'Roms/sec':>12}{'Images/sec':>12}"
+            f"{'Files/sec':>12}"
+        )
+        for i, item in enumerate(data["workers"]):
+            lines.append(
+                f"{i:<20}{item['roms']:>10}{item['images']:>14}"
+                f"{item['roms_per_sec']:>12.0f}{item['images_per_sec']:>12.1f}"
+                f"{item['files_per_sec']:>12.0f}"
+            )
+        return "\n".join(lines)
+
+
+def rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds else 0
+
+
+# Module level so each worker process records its own metrics
+metrics = Metrics()
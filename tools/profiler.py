@@ -0,0 +1,122 @@
+import os, re, sys, cProfile, pstats, threading
+from collections import Counter
+from contextlib import contextmanager
+
+SAMPLE_INTERVAL = 0.005
+TOOLS_PATH = re.escape(os.path.join("tools", ""))
+
+
+class TaskProfiler:
+    """Deterministic profile of every task run by a worker, dumped per process"""
+
+    path: str
+    profile: cProfile.Profile
+
+    def __init__(self, path: str):
+        self.path = os.path.join(path, f"{os.getpid()}.prof")
+        self.profile = cProfile.Profile()
+
+    @contextmanager
+    def task(self):
+        """Profile block, then write stats so far"""
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.profile.dump_stats(self.path)
+
+
+class SampleProfiler:
+    """Low overhead profile from stack samples of the task thread, dumped per process"""
+
+    path: str
+    interval: float
+    samples: Counter
+
+    def __init__(self, path: str, interval: float = SAMPLE_INTERVAL):
+        self.path = os.path.join(path, f"{os.getpid()}.samples")
+        self.interval = interval
+        self.samples = Counter()
+
+    @contextmanager
+    def task(self):
+        """Sample block, then write samples so far"""
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self.__sample, args=(threading.get_ident(), stop), daemon=True
+        )
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            write_samples(self.samples, self.path)
+
+    def __sample(self, ident: int, stop: threading.Event):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(ident)
+            stack = []
+            while frame:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+
+def write_samples(samples: Counter, path: str):
+    """Write samples as collapsed stacks, one 'a;b;c count' line per stack"""
+    with open(path, "w") as file:
+        file.writelines(f"{stack} {count}\n" for stack, count in samples.items())
+
+
+def read_samples(path: str) -> Counter:
+    samples = Counter()
+    with open(path) as file:
+        for line in file:
+            stack, count = line.rstrip("\n").rsplit(" ", 1)
+            samples[stack] += int(count)
+    return samples
+
+
+def merge_profiles(path: str, output: str, limit: int = 20):
+    """Merge worker profiles in path into output and print the hottest tools functions"""
+    names = sorted(os.listdir(path))
+    profiles = [os.path.join(path, n) for n in names if n.endswith(".prof")]
+    samples = [os.path.join(path, n) for n in names if n.endswith(".samples")]
+
+    if profiles:
+        pstats.Stats(*profiles).dump_stats(output)
+        stats = pstats.Stats(output)
+        print(f"Merged {len(profiles)} worker profiles into {output}")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(TOOLS_PATH, limit)
+
+    if samples:
+        merged = Counter()
+        for sample in samples:
+            merged += read_samples(sample)
+        write_samples(merged, output)
+        print(f"Merged {len(samples)} worker samples into {output}")
+        print_samples(merged, limit)
+
+
+def print_samples(samples: Counter, limit: int = 20):
+    """Print tools functions with the most samples, self and inclusive"""
+    own = Counter()
+    total = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    count = sum(samples.values())
+    print(f"{count} samples\n")
+    print(f"{'Self':>8}{'Self %':>8}{'Total':>8}{'Total %':>8}  Function")
+    hot = [f for f, n in own.most_common() if re.search(TOOLS_PATH, f)][:limit]
+    for frame in hot:
+        print(
+            f"{own[frame]:>8}{own[frame] / count:>8.1%}"
+            f"{total[frame]:>8}{total[frame] / count:>8.1%}  {frame}"
+        )
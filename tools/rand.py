@@ -1,9 +1,15 @@
-import string, re, json, os, zipfile
-from random import randint, choice, random, shuffle
+import string, re, json, copy
+import numpy as np
+from random import Random
+from typing import Iterable
+from PIL import ImageFont
+from tools.font import FontCatalog, FONT_CACHE_PATH, font_cache
 
+ROM_CHUNK = 2048
 
-def chance(percent: float) -> bool:
-    return random() <= percent
+
+def chance(rng: Random, percent: float) -> bool:
+    return rng.random() <= percent
 
 
 def plural(value: str, keep: bool) -> str:
@@ -14,137 +20,469 @@ def trim(value: str) -> str:
     return re.sub(r"\s+", " ", value.strip())
 
 
+def title_to_romname(title: str) -> str:
+    """Long title to short romname"""
+    parts = re.sub(r"\([^)]+\)|[^a-z ]", "", title.lower()).strip().split(" ")
+    return "".join([p[:2] for p in parts])
+
+
+def table(values: list, prefix: str = "") -> np.ndarray:
+    """Object array of trimmed values, each non-empty value prefixed"""
+    values = [trim(str(v)) for v in values]
+    return np.array([f"{prefix}{v}" if v else v for v in values], dtype=object)
+
+
+def combine(*tables: np.ndarray) -> np.ndarray:
+    """Every combination of one value from each table joined in order, flattened"""
+    result = tables[0]
+    for values in tables[1:]:
+        result = np.add.outer(result, values).ravel()
+    return result
+
+
+def chances(rng: np.random.Generator, count: int, percent: float) -> np.ndarray:
+    return rng.random(count) <= percent
+
+
+def optional(rng: np.random.Generator, size: int, present: np.ndarray) -> np.ndarray:
+    """Random indexes past the leading empty entry, 0 where not present"""
+    return np.where(present, rng.integers(1, size, len(present)), 0)
+
+
+class RomTables:
+    """Rom values compiled once into arrays, so batches are assembled by index
+
+    Parts that are joined in every rom are combined up front, so a field is one
+    lookup rather than a string join per rom. Optional parts lead with an empty
+    entry at index 0 and are prefixed with their separator, so the result never
+    needs trimming. Title parts have matching romname fragments, since
+    title_to_romname works word by word.
+    """
+
+    sizes: dict[str, int]
+    lead: np.ndarray
+    lead_romname: np.ndarray
+    tail: np.ndarray
+    tail_romname: np.ndarray
+    manufacturer: np.ndarray
+    category: np.ndarray
+    players: np.ndarray
+    controls: np.ndarray
+    fields: dict[str, np.ndarray]
+
+    def __init__(self, data: dict):
+        title = data["title"]
+        last = [plural(v, True) for v in title["last"]]
+        last += [plural(v, False) for v in title["last"]]
+        parts = {
+            "first": [""] + title["first"],
+            "middle": [""] + title["middle"],
+            "last": [""] + last,
+            "sequel": [""] + title["sequel"],
+            "version": [""] + title["version"],
+            "head": data["manufacturer"]["head"],
+            "tail": data["manufacturer"]["tail"],
+            "location": [""] + data["manufacturer"]["location"],
+            "type": data["category"]["type"],
+            "subtype": data["category"]["subtype"],
+            "orientation": [""] + data["category"]["orientation"],
+        }
+        self.sizes = {name: len(values) for name, values in parts.items()}
+        words = {name: table(values, " ") for name, values in parts.items()}
+        fragments = {
+            name: table([title_to_romname(v) for v in values])
+            for name, values in parts.items()
+        }
+
+        # title - one of first or middle is always present, leading the title
+        lead = combine(words["first"], words["middle"])
+        self.lead = np.array([v[1:] for v in lead], dtype=object)
+        self.lead_romname = combine(fragments["first"], fragments["middle"])
+        self.tail = combine(words["last"], words["sequel"], words["version"])
+        self.tail_romname = combine(
+            fragments["last"], fragments["sequel"], fragments["version"]
+        )
+
+        self.manufacturer = combine(
+            table(parts["head"]), table(parts["tail"]), words["location"]
+        )
+        self.category = combine(
+            table(parts["type"]), table(parts["subtype"], " / "), words["orientation"]
+        )
+
+        # control repeats the joystick once per player, indexed by both
+        self.players = table(data["players"])
+        self.controls = np.array(
+            [",".join([j] * p) for j in data["joystick"] for p in data["players"]],
+            dtype=object,
+        )
+        self.fields = {
+            name: table(data[name])
+            for name in ["year", "rotation", "status", "buttons", "language"]
+        }
+
+
+def codes(values: np.ndarray, size: int) -> np.ndarray:
+    """Values as the smallest unsigned type holding indexes below size"""
+    return values.astype(np.min_scalar_type(max(0, size - 1)))
+
+
+class RomChunk:
+    """Roms of one chunk stored by column, each value a compact code into a table
+
+    Strings are only built for the rows asked for. Name and title are both built
+    from the lead and tail codes of the title, names numbered by row.
+    """
+
+    start: int
+    count: int
+    tables: RomTables
+    codes: dict[str, np.ndarray]
+    values: dict[str, np.ndarray]
+
+    def __init__(self, start: int, tables: RomTables, codes: dict, values: dict):
+        self.start = start
+        self.count = len(codes["lead"])
+        self.tables = tables
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return self.count
+
+    def column(self, field: str, index: slice | np.ndarray = slice(None)) -> list:
+        """Values of field for rows of the chunk at index, a slice or array of rows"""
+        t = self.tables
+        lead = self.codes["lead"][index]
+        tail = self.codes["tail"][index]
+        if field == "name":
+            number = np.arange(self.start, self.start + self.count)[index]
+            number = number.astype(str).astype(object)
+            return (t.lead_romname[lead] + t.tail_romname[tail] + number).tolist()
+        if field == "title":
+            return (t.lead[lead] + t.tail[tail]).tolist()
+        return self.values[field][self.codes[field][index]].tolist()
+
+
+class Romlist:
+    """Roms generated a chunk at a time, each chunk from its own seeded generator
+
+    Nothing is held per rom, so memory is flat at any count, and the rows of any
+    chunk are rebuilt from the seed alone, without the chunks before it. Name and
+    title only need the title codes, drawn first, so they skip the other columns.
+    The last of those is kept, so rows read a few at a time build it once.
+    """
+
+    count: int
+    seed: int
+    tables: RomTables
+    titles: RomChunk
+
+    def __init__(self, tables: RomTables, count: int, seed: int):
+        self.count = count
+        self.seed = seed
+        self.tables = tables
+        self.titles = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def chunk(self, start: int, title: bool = False) -> RomChunk:
+        """Return the chunk holding row start, with only title codes if title
+
+        Matches title, manufacturer, category etc. in distribution, built for the
+        whole chunk at once.
+        """
+        start -= start % ROM_CHUNK
+        if title and self.titles and self.titles.start == start:
+            return self.titles
+        count = min(ROM_CHUNK, self.count - start)
+        rng = np.random.default_rng([self.seed, start // ROM_CHUNK])
+        t = self.tables
+        size = t.sizes
+
+        # title - first, middle and last, with one of them dropped 40% of the time
+        dropped = np.where(chances(rng, count, 0.6), 3, rng.integers(0, 3, count))
+        first = optional(rng, size["first"], dropped != 0)
+        middle = optional(rng, size["middle"], dropped != 1)
+        last = optional(rng, size["last"], dropped != 2)
+        sequel = optional(rng, size["sequel"], chances(rng, count, 0.25))
+        version = optional(rng, size["version"], chances(rng, count, 0.5))
+        lead = first * size["middle"] + middle
+        tail = (last * size["sequel"] + sequel) * size["version"] + version
+        columns = {"lead": (lead, len(t.lead)), "tail": (tail, len(t.tail))}
+        values = {}
+        if not title:
+            other, values = self.__columns(rng, count)
+            columns.update(other)
+        chunk = RomChunk(
+            start, t, {name: codes(*column) for name, column in columns.items()}, values
+        )
+        if title:
+            self.titles = chunk
+        return chunk
+
+    def __columns(self, rng: np.random.Generator, count: int) -> tuple[dict, dict]:
+        """Return (codes, size) and values of every column after the title"""
+        t = self.tables
+        size = t.sizes
+
+        # manufacturer - each has a 12.5% chance of another joined after it,
+        # joined names are appended as values of their own
+        manufacturer = self.__manufacturers(rng, count)
+        extra = np.flatnonzero(chances(rng, count, 0.125))
+        joined = t.manufacturer[manufacturer[extra]]
+        chain = np.arange(len(extra))
+        while len(chain):
+            more = t.manufacturer[self.__manufacturers(rng, len(chain))]
+            joined[chain] += " / " + more
+            chain = chain[chances(rng, len(chain), 0.125)]
+        manufacturer[extra] = len(t.manufacturer) + np.arange(len(extra))
+        manufacturers = np.concatenate([t.manufacturer, joined])
+
+        category = rng.integers(0, size["type"] * size["subtype"], count)
+        orientation = optional(rng, size["orientation"], chances(rng, count, 0.25))
+        category = category * size["orientation"] + orientation
+
+        players = rng.integers(0, len(t.players), count)
+        control = rng.integers(0, len(t.controls) // len(t.players), count)
+        control = control * len(t.players) + players
+
+        values = {
+            "manufacturer": manufacturers,
+            "category": t.category,
+            "players": t.players,
+            "control": t.controls,
+            **t.fields,
+        }
+        columns = {
+            "manufacturer": (manufacturer, len(manufacturers)),
+            "category": (category, len(t.category)),
+            "players": (players, len(t.players)),
+            "control": (control, len(t.controls)),
+            **{
+                name: (rng.integers(0, len(v), count), len(v))
+                for name, v in t.fields.items()
+            },
+        }
+        return columns, values
+
+    def chunks(self, start: int = 0, stop: int = None, title: bool = False):
+        """Yield each chunk holding rows start to stop"""
+        stop = self.count if stop is None else min(stop, self.count)
+        for chunk in range(start - start % ROM_CHUNK, stop, ROM_CHUNK):
+            yield self.chunk(chunk, title)
+
+    def column(self, field: str, index: slice | Iterable[np.ndarray] = slice(None)):
+        """Yield values of field for rows at index, a slice or sorted rows by chunk
+
+        Rows are built a chunk at a time, so only one chunk is held at once.
+        """
+        for values in self.columns([field], index):
+            yield values[0]
+
+    def columns(
+        self, fields: list[str], index: slice | Iterable[np.ndarray] = slice(None)
+    ):
+        """Yield a tuple of values of fields for each row at index, as column"""
+        title = all(field in ["name", "title"] for field in fields)
+        for chunk, rows in self.__rows(index, title):
+            yield from zip(*[chunk.column(field, rows) for field in fields])
+
+    def __rows(self, index: slice | Iterable[np.ndarray], title: bool):
+        """Yield each chunk holding rows at index, with its rows at index"""
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self.count)
+            for chunk in self.chunks(start, stop, title):
+                yield chunk, slice(max(0, start - chunk.start), stop - chunk.start)
+            return
+        for rows in index:
+            if len(rows):
+                chunk = self.chunk(int(rows[0]), title)
+                yield chunk, rows - chunk.start
+
+    def select(self, rng: np.random.Generator, low=0.20, high=0.30):
+        """Yield sorted rows of a random selection by chunk, each chosen at a ratio
+
+        Only the chosen rows are drawn, their count per chunk from a binomial.
+        """
+        ratio = rng.uniform(low, high)
+        for start in range(0, self.count, ROM_CHUNK):
+            count = min(ROM_CHUNK, self.count - start)
+            chosen = rng.binomial(count, ratio)
+            rows = rng.choice(count, chosen, replace=False, shuffle=False)
+            rows.sort()
+            yield start + rows
+
+    def __manufacturers(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        """Indexes into manufacturer table, with a 25% chance of a location"""
+        size = self.tables.sizes
+        company = rng.integers(0, size["head"] * size["tail"], count)
+        location = optional(rng, size["location"], chances(rng, count, 0.25))
+        return company * size["location"] + location
+
+
 class Rand:
     data: dict
-    fonts_display: list
-    fonts_foreground: list
-    fonts_background: list
-
-    def __init__(self, path: str):
+    tables: RomTables
+    fonts_display: list[str]
+    fonts_foreground: list[str]
+    fonts_background: list[str]
+    key: str
+    rng: Random
+
+    def __init__(self, path: str, key: str = "", cache_path: str = None):
         with open(path) as file:
             self.data = json.load(file)
-        self.__init_fonts()
-
-    def __init_fonts(self):
-        self.fonts_display = self.__get_path_fonts(self.data["font"]["display"])
-        self.fonts_foreground = self.__get_path_fonts(self.data["font"]["foreground"])
-        self.fonts_background = self.__get_path_fonts(self.data["font"]["background"])
-
-    def __get_path_fonts(self, path: str):
-        names = [f for f in next(os.walk(path), ([], [], []))[2] if f.endswith(".zip")]
-        files = []
-        for n in names:
-            name = os.path.join(path, n)
-            zip = zipfile.ZipFile(name)
-            info = self.__get_best_font(zip)
-            files.append((name, info))
-        return files
-
-    def __get_best_font(self, font_zip: zipfile.ZipFile) -> zipfile.ZipInfo:
-        best = None
-        file = None
-        for info in font_zip.infolist():
-            filename = info.filename
-            if filename.lower().endswith(".ttf") or filename.lower().endswith(".otf"):
-                if not best or len(filename) < len(best):
-                    best = filename
-                    file = info
-        return file
-
-    # Fonts return a file from zipped font - must open each time as it gets closed after use
-    def font_foreground(self):
-        font = choice(self.fonts_foreground)
-        return zipfile.ZipFile(font[0]).open(font[1], "r")
-
-    def font_display(self):
-        font = choice(self.fonts_display)
-        return zipfile.ZipFile(font[0]).open(font[1], "r")
-
-    def font_background(self):
-        font = choice(self.fonts_background)
-        return zipfile.ZipFile(font[0]).open(font[1], "r")
+        self.tables = RomTables(self.data)
+        self.__init_fonts(cache_path)
+        self.key = key
+        self.rng = Random(key)
+
+    def stream(self, *keys) -> "Rand":
+        """Return Rand sharing data, with its own random stream derived from keys"""
+        rand = copy.copy(self)
+        rand.key = "/".join([self.key, *[str(k) for k in keys]])
+        rand.rng = Random(rand.key)
+        return rand
+
+    def __init_fonts(self, cache_path: str = None):
+        catalog = FontCatalog(cache_path or FONT_CACHE_PATH)
+        self.fonts_display = catalog.fonts(self.data["font"]["display"])
+        self.fonts_foreground = catalog.fonts(self.data["font"]["foreground"])
+        self.fonts_background = catalog.fonts(self.data["font"]["background"])
+        catalog.save()
+
+    # Fonts return a cached truetype font at size from extracted font
+    def font_foreground(self, size: int) -> ImageFont.FreeTypeFont:
+        return font_cache.get(self.rng.choice(self.fonts_foreground), size)
+
+    def font_display(self, size: int) -> ImageFont.FreeTypeFont:
+        return font_cache.get(self.rng.choice(self.fonts_display), size)
+
+    def font_background(self, size: int) -> ImageFont.FreeTypeFont:
+        return font_cache.get(self.rng.choice(self.fonts_background), size)
 
     # Special case - bg font contains art for a limited number of characters
     def fonts_background_char(self):
-        return choice(self.data["font"]["background_chars"])
+        return self.rng.choice(self.data["font"]["background_chars"])
 
     def snap_size(self) -> tuple[int, int]:
         return (
-            randint(self.data["snap"]["width_min"], self.data["snap"]["width_max"]),
-            randint(self.data["snap"]["height_min"], self.data["snap"]["height_max"]),
+            self.rng.randint(
+                self.data["snap"]["width_min"], self.data["snap"]["width_max"]
+            ),
+            self.rng.randint(
+                self.data["snap"]["height_min"], self.data["snap"]["height_max"]
+            ),
         )
 
     def wheel_size(self) -> tuple[int, int]:
         return (
-            randint(self.data["wheel"]["width_min"], self.data["wheel"]["width_max"]),
-            randint(self.data["wheel"]["height_min"], self.data["wheel"]["height_max"]),
+            self.rng.randint(
+                self.data["wheel"]["width_min"], self.data["wheel"]["width_max"]
+            ),
+            self.rng.randint(
+                self.data["wheel"]["height_min"], self.data["wheel"]["height_max"]
+            ),
         )
 
     def title(self) -> str:
-        n = [True, True, chance(0.6)]
-        shuffle(n)
-        a = choice(self.data["title"]["first"]) if n[0] else ""
-        b = choice(self.data["title"]["middle"]) if n[1] else ""
-        c = plural(choice(self.data["title"]["last"]), chance(0.5)) if n[2] else ""
-        d = choice(self.data["title"]["sequel"]) if chance(0.25) else ""
-        e = choice(self.data["title"]["version"]) if chance(0.5) else ""
+        n = [True, True, chance(self.rng, 0.6)]
+        self.rng.shuffle(n)
+        a = self.rng.choice(self.data["title"]["first"]) if n[0] else ""
+        b = self.rng.choice(self.data["title"]["middle"]) if n[1] else ""
+        c = (
+            plural(self.rng.choice(self.data["title"]["last"]), chance(self.rng, 0.5))
+            if n[2]
+            else ""
+        )
+        d = (
+            self.rng.choice(self.data["title"]["sequel"])
+            if chance(self.rng, 0.25)
+            else ""
+        )
+        e = (
+            self.rng.choice(self.data["title"]["version"])
+            if chance(self.rng, 0.5)
+            else ""
+        )
         return trim(f"{a} {b} {c} {d} {e}")
 
     def manufacturer(self) -> str:
-        a = choice(self.data["manufacturer"]["head"])
-        b = choice(self.data["manufacturer"]["tail"])
-        c = choice(self.data["manufacturer"]["location"]) if chance(0.25) else ""
-        d = f" / {self.manufacturer()}" if chance(0.125) else ""
+        a = self.rng.choice(self.data["manufacturer"]["head"])
+        b = self.rng.choice(self.data["manufacturer"]["tail"])
+        c = (
+            self.rng.choice(self.data["manufacturer"]["location"])
+            if chance(self.rng, 0.25)
+            else ""
+        )
+        d = f" / {self.manufacturer()}" if chance(self.rng, 0.125) else ""
         return trim(f"{a}{b} {c}{d}")
 
     def category(self) -> str:
-        a = choice(self.data["category"]["type"])
-        b = choice(self.data["category"]["subtype"])
-        c = choice(self.data["category"]["orientation"]) if chance(0.25) else ""
+        a = self.rng.choice(self.data["category"]["type"])
+        b = self.rng.choice(self.data["category"]["subtype"])
+        c = (
+            self.rng.choice(self.data["category"]["orientation"])
+            if chance(self.rng, 0.25)
+            else ""
+        )
         return trim(f"{a} / {b} {c}")
 
     def status(self) -> str:
-        return choice(self.data["status"])
+        return self.rng.choice(self.data["status"])
 
     def language(self) -> str:
-        return choice(self.data["language"])
+        return self.rng.choice(self.data["language"])
 
     def tags(self, limit) -> list[str]:
         tags = self.data["tags"]
-        shuffle(tags)
-        tags = tags[:limit]
+        tags = self.rng.sample(tags, min(limit, len(tags)))
         tags.sort()
         return tags
 
     def year(self) -> str:
-        return choice(self.data["year"])
+        return self.rng.choice(self.data["year"])
 
     def rotation(self) -> str:
-        return choice(self.data["rotation"])
+        return self.rng.choice(self.data["rotation"])
 
     def joystick(self) -> str:
-        return choice(self.data["joystick"])
+        return self.rng.choice(self.data["joystick"])
 
     def buttons(self) -> str:
-        return choice(self.data["buttons"])
+        return self.rng.choice(self.data["buttons"])
 
     def players(self) -> int:
-        return choice(self.data["players"])
+        return self.rng.choice(self.data["players"])
+
+    def generator(self) -> np.random.Generator:
+        """Return a NumPy generator seeded by the next value of this stream"""
+        return np.random.default_rng(self.rng.getrandbits(128))
+
+    def roms(self, count: int) -> Romlist:
+        """Return a romlist of count roms, seeded by this stream"""
+        return Romlist(self.tables, count, self.rng.getrandbits(128))
 
     def system(self) -> str:
-        a = choice(self.data["system"]["head"])
-        b = choice(self.data["system"]["tail"])
-        c = choice(self.data["system"]["version"]) if chance(0.25) else ""
+        a = self.rng.choice(self.data["system"]["head"])
+        b = self.rng.choice(self.data["system"]["tail"])
+        c = (
+            self.rng.choice(self.data["system"]["version"])
+            if chance(self.rng, 0.25)
+            else ""
+        )
         return trim(f"{a}{b} {c}")
 
     def rule_str(self) -> str:
-        field = choice(["Title", "Manufacturer"])
-        compare = choice(["contains", "not_contains"])
-        value = choice(string.ascii_lowercase)
+        field = self.rng.choice(["Title", "Manufacturer"])
+        compare = self.rng.choice(["contains", "not_contains"])
+        value = self.rng.choice(string.ascii_lowercase)
         return f"{field} {compare} {value}"
 
     def rule_int(self) -> str:
-        field = choice(["Year", "PlayedCount", "PlayedTime"])
-        compare = choice(["contains", "not_contains"])
-        value = str(randint(0, 9))
+        field = self.rng.choice(["Year", "PlayedCount", "PlayedTime"])
+        compare = self.rng.choice(["contains", "not_contains"])
+        value = str(self.rng.randint(0, 9))
         return f"{field} {compare} {value}"
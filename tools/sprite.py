@@ -1,7 +1,24 @@
+import math
+from collections import OrderedDict
+from typing import Callable
 from PIL import Image, ImageDraw, ImageFilter
-from random import randint, choice
+from random import Random
 from tools.utils import create_arc
 from tools.draw import create_gradient
+from tools.font import CacheInfo
+from tools.metrics import metrics
+
+# Size buckets per doubling, sprites within ~9% of a size share variants
+SIZE_STEPS = 8
+
+# Shapes are drawn in basis colours, each channel the coverage of one sprite colour
+# as ZERO + (ONE - ZERO) * coverage, leaving room for filters to overshoot
+ZERO = 64
+ONE = 192
+RED = (ONE, ZERO, ZERO)
+GREEN = (ZERO, ONE, ZERO)
+BLUE = (ZERO, ZERO, ONE)
+BLACK = (ZERO, ZERO, ZERO)
 
 
 def create_star(
@@ -21,31 +38,61 @@ def create_star(
     return im
 
 
+def recolor(shape: Image.Image, colors: tuple, base: tuple = (0, 0, 0)) -> Image.Image:
+    """Return shape with red, green and blue coverage replaced by colors
+
+    Each output channel is a linear mix of the shape channels, so edges blurred or
+    filtered in basis colours blend between the sprite colours, and black is base.
+    """
+    colors = [*colors, *[base] * (3 - len(colors))]
+    matrix = []
+    for i in range(3):
+        scale = [(color[i] - base[i]) / (ONE - ZERO) for color in colors]
+        matrix += [*scale, base[i] - sum(scale) * ZERO]
+    im = shape.convert("RGB").convert("RGB", tuple(matrix))
+    im.putalpha(shape.getchannel("A"))
+    return im
+
+
 def create_flash(
     size: tuple[int, int],
     thickness: int,
     fill: tuple,
     outline: tuple,
+    rng: Random,
 ) -> Image.Image:
     """Create muzzle flash image"""
+    shape = sprite_pool.get(flash_shape, size=size, thickness=thickness, rng=rng)
+    return recolor(shape, (fill, outline))
+
+
+def flash_shape(
+    size: tuple[int, int],
+    *,
+    thickness: int,
+    rng: Random,
+) -> Image.Image:
+    """Create muzzle flash shape, red fill and green outline"""
     w, h = size
     x = int(w / 2)
-    im = Image.new("RGBA", size)
+    im = Image.new("RGBA", size, (*BLACK, 0))
     draw = ImageDraw.Draw(im)
 
-    n = randint(5, 15)
+    n = rng.randint(5, 15)
     coords = [(x, h - 1)]
     arc1 = create_arc((x, h - 1), direction=90, arc=60, distance=h, count=n)
     arc2 = create_arc((x, h - 1), direction=90, arc=60, distance=int(h * 0.75), count=n)
     for i, a in enumerate(arc1):
         px, py, pr = arc2[i] if (i % 2 == 1) else a
-        py += int((abs(i - int(n / 2)) / int(n / 2)) * randint(int(h / 3), int(h / 2)))
+        py += int(
+            (abs(i - int(n / 2)) / int(n / 2)) * rng.randint(int(h / 3), int(h / 2))
+        )
         coords.append((px, py))
 
     draw.polygon(
         coords,
-        fill=fill,
-        outline=outline,
+        fill=RED,
+        outline=GREEN,
         width=thickness,
     )
     return im
@@ -58,14 +105,35 @@ def create_bullet(
     radius: int,
     fill: tuple,
     outline: tuple,
+    rng: Random,
     type: str = None,
 ) -> Image.Image:
     """Create bullet sprite"""
-    im = Image.new("RGBA", size)
+    shape = sprite_pool.get(
+        bullet_shape,
+        size=size,
+        thickness=thickness,
+        radius=radius,
+        rng=rng,
+        type=type,
+    )
+    return recolor(shape, (fill, outline))
+
+
+def bullet_shape(
+    size: tuple[int, int],
+    *,
+    thickness: int,
+    radius: int,
+    rng: Random,
+    type: str = None,
+) -> Image.Image:
+    """Create bullet shape, red fill and green outline"""
+    im = Image.new("RGBA", size, (*BLACK, 0))
     draw = ImageDraw.Draw(im)
     w, h = size
     if not type:
-        type = choice(["arrow", "chevron", "diamond", "double", "square", "round"])
+        type = rng.choice(["arrow", "chevron", "diamond", "double", "square", "round"])
 
     match type:
         case "arrow":
@@ -73,8 +141,8 @@ def create_bullet(
             y = h / 4
             draw.polygon(
                 ((0, h - 1), (x, h - y), (w - 1, h - 1), (x, 0)),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=int(thickness / 2),
             )
         case "chevron":
@@ -82,8 +150,8 @@ def create_bullet(
             y = h / 5
             draw.polygon(
                 ((0, y), (x, 0), (w - 1, y), (w - 1, h - 1), (x, h - y), (0, h - 1)),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=thickness,
             )
         case "diamond":
@@ -91,39 +159,39 @@ def create_bullet(
             y = h / 4
             draw.polygon(
                 ((0, y), (x, 0), (w - 1, y), (x, h - 1)),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=int(thickness / 2),
             )
         case "double":
             v = w / 3
             draw.rounded_rectangle(
                 (0, 0, v, h - 1),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=int(thickness / 2),
                 radius=radius,
             )
             draw.rounded_rectangle(
                 (w - v - 1, 0, w - 1, h - 1),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=int(thickness / 2),
                 radius=radius,
             )
         case "square":
             draw.rounded_rectangle(
                 (0, 0, w - 1, h - 1),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=thickness,
                 radius=radius,
             )
         case "round":
             draw.ellipse(
                 (0, 0, w - 1, h - 1),
-                fill=fill,
-                outline=outline,
+                fill=RED,
+                outline=GREEN,
                 width=thickness,
             )
     return im
@@ -135,37 +203,48 @@ def create_ship(
     body_color: tuple,
     pod_color: tuple,
     detail_color: tuple,
+    rng: Random,
 ):
     """Create ship sprite"""
+    shape = sprite_pool.get(ship_shape, size=size, rng=rng)
+    return recolor(shape, (body_color, pod_color, detail_color))
+
+
+def ship_shape(
+    size: tuple[int, int],
+    *,
+    rng: Random,
+) -> Image.Image:
+    """Create ship shape, red body, green pod and blue detail"""
     width, height = size
     x_mid = int(width / 2)
 
     wing_base_height_min = int(height / 4)
-    wing_base_top = randint(0, height - 1 - wing_base_height_min)
-    wing_base_bottom = wing_base_top + randint(
+    wing_base_top = rng.randint(0, height - 1 - wing_base_height_min)
+    wing_base_bottom = wing_base_top + rng.randint(
         wing_base_height_min, height - 1 - wing_base_top
     )
     wing_tip_height_max = int((wing_base_bottom - wing_base_top) / 2)
-    wing_tip_top = randint(0, height - 1 - wing_tip_height_max)
-    wing_tip_bottom = wing_tip_top + randint(0, wing_tip_height_max)
+    wing_tip_top = rng.randint(0, height - 1 - wing_tip_height_max)
+    wing_tip_bottom = wing_tip_top + rng.randint(0, wing_tip_height_max)
 
     body_width_min = int(width / 15)
     body_width_max = int(width / 7)
     body_split_max = int(min(width, height) / 15)
-    body_split_width = randint(0, body_split_max)
-    body_top_width = randint(0, body_split_max)
-    body_mid_width = randint(body_top_width, body_width_max)
-    body_bottom_width = randint(0, body_width_min)
-    body_mid_top = randint(body_top_width, height - 1 - body_bottom_width)
+    body_split_width = rng.randint(0, body_split_max)
+    body_top_width = rng.randint(0, body_split_max)
+    body_mid_width = rng.randint(body_top_width, body_width_max)
+    body_bottom_width = rng.randint(0, body_width_min)
+    body_mid_top = rng.randint(body_top_width, height - 1 - body_bottom_width)
 
-    split_top = randint(0, int(height / 2))
-    split_bottom = randint(split_top + body_split_width, height - 1)
+    split_top = rng.randint(0, int(height / 2))
+    split_bottom = rng.randint(split_top + body_split_width, height - 1)
 
-    pod_width = randint(
+    pod_width = rng.randint(
         max(body_split_width, body_split_max), body_split_width + body_split_max
     )
-    pod_height = randint(pod_width * 2, int(height / 2))
-    pod_top = randint(0, min(int(height / 2), height - pod_height))
+    pod_height = rng.randint(pod_width * 2, int(height / 2))
+    pod_top = rng.randint(0, min(int(height / 2), height - pod_height))
 
     wing = [
         (x_mid + body_split_width, wing_base_top),
@@ -192,13 +271,13 @@ def create_ship(
         (x_mid, pod_top + pod_height),
     ]
 
-    im = Image.new("RGBA", size)
+    im = Image.new("RGBA", size, (*BLACK, 0))
     draw = ImageDraw.Draw(im)
-    draw.polygon(wing, fill=body_color)
-    draw.polygon(split, fill=body_color)
-    draw.polygon(body, fill=body_color)
-    draw.line((*body[2], *body[3]), fill=detail_color, width=1)
-    draw.line((*pod[1], *wing[1]), fill=detail_color, width=1)
+    draw.polygon(wing, fill=RED)
+    draw.polygon(split, fill=RED)
+    draw.polygon(body, fill=RED)
+    draw.line((*body[2], *body[3]), fill=BLUE, width=1)
+    draw.line((*pod[1], *wing[1]), fill=BLUE, width=1)
     draw.line(
         (
             x_mid + body_split_width,
@@ -206,10 +285,10 @@ def create_ship(
             width - 1,
             wing_tip_top,
         ),
-        fill=detail_color,
+        fill=BLUE,
         width=1,
     )
-    draw.polygon(pod, fill=pod_color)
+    draw.polygon(pod, fill=GREEN)
     im.alpha_composite(im.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
 
     return (
@@ -227,26 +306,36 @@ def create_powerup(
     col2: tuple,
 ):
     """Create powerup sprite"""
+    shape = sprite_pool.get(powerup_shape, size=size, sides=sides)
+    return recolor(shape, (col1, col2, (127, 127, 127)))
+
+
+def powerup_shape(
+    *,
+    size: tuple[int, int],
+    sides: int,
+) -> Image.Image:
+    """Create powerup shape, red inside, green rim and blue edge"""
     width, height = size
     thickness = int(min(width, height) / 7)
     x = int(width / 2)
     y = int(height / 2)
-    im = Image.new("RGBA", size)
+    im = Image.new("RGBA", size, (*BLACK, 0))
     draw = ImageDraw.Draw(im)
 
     draw.regular_polygon(
         bounding_circle=(x, y, x - 1),
         n_sides=sides,
-        fill=col2,
-        outline=col2,
+        fill=GREEN,
+        outline=GREEN,
         width=thickness,
     )
 
     draw.regular_polygon(
         bounding_circle=(x, y, x - thickness - 1),
         n_sides=sides,
-        fill=col1,
-        outline=(127, 127, 127),
+        fill=RED,
+        outline=BLUE,
         width=int(thickness / 2),
     )
 
@@ -260,8 +349,22 @@ def create_boom(
     col2: tuple,
     col3: tuple,
     col4: tuple,
+    rng: Random,
 ):
     """Create explosion sprite"""
+    shape = sprite_pool.get(boom_shape, size=size, rng=rng)
+    return recolor(shape, (col2, col3, col4), col1)
+
+
+def boom_shape(
+    size: tuple[int, int],
+    *,
+    rng: Random,
+) -> Image.Image:
+    """Create explosion shape, black outer ring, red, green inner ring and blue
+
+    Quantized after the blur, so a recoloured boom has the same 32 levels.
+    """
     width, height = size
     thickness = int(min(width, height) / 20)
     pad = thickness * 2
@@ -269,30 +372,30 @@ def create_boom(
     y = int(height / 2)
     x2 = int(width / 8)
     y2 = int(height / 8)
-    im = Image.new("RGBA", size, tuple([*list(col1), 0]))
+    im = Image.new("RGBA", size, (*BLACK, 0))
     draw = ImageDraw.Draw(im)
     for i in range(5):
         draw.ellipse(
             (
-                randint(pad, x),
-                randint(pad, y),
-                randint(x, width - 1 - pad),
-                randint(y, height - 1 - pad),
+                rng.randint(pad, x),
+                rng.randint(pad, y),
+                rng.randint(x, width - 1 - pad),
+                rng.randint(y, height - 1 - pad),
             ),
-            outline=col1,
-            fill=col2,
+            outline=BLACK,
+            fill=RED,
             width=thickness,
         )
     for i in range(5):
         draw.ellipse(
             (
-                randint(pad + x2, x),
-                randint(pad + y2, y),
-                randint(x, width - 1 - pad - x2),
-                randint(y, height - 1 - pad - y2),
+                rng.randint(pad + x2, x),
+                rng.randint(pad + y2, y),
+                rng.randint(x, width - 1 - pad - x2),
+                rng.randint(y, height - 1 - pad - y2),
             ),
-            outline=col3,
-            fill=col4,
+            outline=GREEN,
+            fill=BLUE,
             width=thickness,
         )
 
@@ -301,3 +404,99 @@ def create_boom(
         .convert("P", colors=32)
         .convert("RGBA")
     )
+
+
+# -------------------------------------------------------------------------------------
+
+
+def size_bucket(size: tuple[int, int]) -> tuple[int, int]:
+    """Return bucket of size, on a log scale so large and small sprites vary alike"""
+    return tuple(round(math.log2(max(1, v)) * SIZE_STEPS) for v in size)
+
+
+class SpritePool:
+    """Bounded pool of sprite shape variants reused across snaps
+
+    Variants are keyed by shape function, size bucket and every other argument.
+    Shapes hold no colour, so one variant serves every colour scheme and a reused
+    sprite is a size close to the one asked for. Each key fills up to variants
+    shapes, after which only a fresh fraction of requests create a new one,
+    replacing a random variant. Keys are evicted least recently used once the
+    pool holds more than maxbytes. Reused shapes depend on what the worker drew
+    before, so pooled output is not reproducible from the seed.
+    """
+
+    variants: int
+    fresh: float
+    maxbytes: int
+    bytes: int
+    hits: int
+    misses: int
+    rng: Random
+    sprites: OrderedDict
+
+    def __init__(self, variants: int = 0, fresh: float = 0.25, maxbytes: int = 1 << 26):
+        self.variants = variants
+        self.fresh = fresh
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.rng = Random()
+        self.sprites = OrderedDict()
+
+    def get(self, create: Callable, **kwargs) -> Image.Image:
+        """Return a shape from create(**kwargs), reusing a pooled variant if enabled"""
+        if not self.variants:
+            return create(**kwargs)
+
+        rng = kwargs.get("rng", self.rng)
+        key = (
+            create.__name__,
+            size_bucket(kwargs["size"]),
+            *((k, v) for k, v in sorted(kwargs.items()) if k not in ("size", "rng")),
+        )
+        variants = self.sprites.setdefault(key, [])
+        self.sprites.move_to_end(key)
+        if len(variants) >= self.variants and rng.random() >= self.fresh:
+            self.hits += 1
+            metrics.add("sprite.reused", 0)
+            return rng.choice(variants)
+
+        self.misses += 1
+        with metrics.time("sprite.fresh"):
+            item = create(**kwargs)
+        if len(variants) >= self.variants:
+            index = rng.randrange(len(variants))
+            self.bytes -= sprite_bytes(variants[index])
+            variants[index] = item
+        else:
+            variants.append(item)
+        self.bytes += sprite_bytes(item)
+        while self.bytes > self.maxbytes and len(self.sprites) > 1:
+            key, evicted = self.sprites.popitem(last=False)
+            self.bytes -= sum(sprite_bytes(v) for v in evicted)
+        return item
+
+    def configure(self, variants: int, fresh: float):
+        """Set variants per key and fresh ratio, emptying the pool"""
+        self.variants = variants
+        self.fresh = fresh
+        self.cache_clear()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxbytes, self.bytes)
+
+    def cache_clear(self):
+        self.sprites.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+def sprite_bytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+# Module level so each worker process pools its own sprites
+sprite_pool = SpritePool()
@@ -1,5 +1,5 @@
 import os, math
-from random import shuffle
+from random import Random
 
 
 def mkdir_if_none(path: str) -> str:
@@ -38,16 +38,16 @@ def zindex_coords(coords: list[tuple]):
     return [*half, *coords[:x]]
 
 
-def shuffle_tuple(val: tuple) -> tuple:
+def shuffle_tuple(val: tuple, rng: Random) -> tuple:
     """Shuffle a tuple in place"""
     n = list(val)
-    shuffle(n)
+    rng.shuffle(n)
     return tuple(n)
 
 
-def shuffle_list(val: list) -> list:
+def shuffle_list(val: list, rng: Random) -> list:
     """Shuffle a list in place"""
-    shuffle(val)
+    rng.shuffle(val)
     return val
 
 
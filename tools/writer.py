@@ -0,0 +1,265 @@
+import io, os, shutil, tempfile
+from concurrent.futures import ThreadPoolExecutor, Future
+from threading import BoundedSemaphore, Lock
+from timeit import default_timer as timer
+from PIL import Image
+from tools.archive import Archive
+
+FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+LINK_MODES = ["hard", "sym", "copy"]
+
+
+class WriterStats:
+    """Files written and seconds spent blocked on writing them"""
+
+    files: int
+    bytes: int
+    seconds: float
+
+    def __init__(self, files: int = 0, bytes: int = 0, seconds: float = 0):
+        self.files = files
+        self.bytes = bytes
+        self.seconds = seconds
+
+
+def write_batch(batch: list[tuple[str, bytes]]):
+    """Write each (path, data) in batch"""
+    for path, data in batch:
+        fd = os.open(path, FILE_FLAGS, 0o666)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+class FileWriter:
+    """Write many small files using a bounded thread pool
+
+    When a stage path is given files are written there first (ideally tmpfs),
+    then moved under root in bulk when the writer closes. With an archive files
+    are always staged, then added to the archive instead.
+    """
+
+    root: str
+    stage: str
+    archive: Archive
+    batch_size: int
+    stats: WriterStats
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        threads: int = 4,
+        queue: int = 64,
+        batch_size: int = 256,
+        stage_path: str = None,
+        archive: Archive = None,
+    ):
+        self.root = root
+        self.archive = archive
+        staged = stage_path or archive
+        self.stage = tempfile.mkdtemp(dir=stage_path) if staged else None
+        self.batch_size = batch_size
+        self.stats = WriterStats()
+        self.__dirs = set()
+        self.__batch = []
+        self.__futures = []
+        self.__slots = BoundedSemaphore(queue)
+        self.__pool = ThreadPoolExecutor(max_workers=threads) if threads else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def path(self, path: str) -> str:
+        """Return location path is written to, staged if enabled"""
+        if not self.stage:
+            return path
+        return os.path.join(self.stage, os.path.relpath(path, self.root))
+
+    def makedirs(self, path: str) -> str:
+        """Create dir once, including parents"""
+        if path not in self.__dirs:
+            start = timer()
+            os.makedirs(self.path(path), exist_ok=True)
+            self.__dirs.add(path)
+            self.stats.seconds += timer() - start
+        return path
+
+    def open(self, path: str, mode: str = "w", buffering: int = -1):
+        """Open file directly, for content too large to queue"""
+        self.stats.files += 1
+        return open(self.path(path), mode, buffering=buffering)
+
+    def write(self, path: str, text: str):
+        """Queue text to be written to path"""
+        data = text.encode()
+        self.stats.files += 1
+        self.stats.bytes += len(data)
+        self.__batch.append((self.path(path), data))
+        if len(self.__batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Submit queued writes, blocks while the pool queue is full"""
+        start = timer()
+        self.__submit()
+        self.stats.seconds += timer() - start
+
+    def __submit(self):
+        batch, self.__batch = self.__batch, []
+        if not batch:
+            return
+        if not self.__pool:
+            write_batch(batch)
+            return
+        self.__slots.acquire()
+        future = self.__pool.submit(write_batch, batch)
+        future.add_done_callback(lambda f: self.__slots.release())
+        self.__futures.append(future)
+        self.__futures = [f for f in self.__futures if not f.done() or f.exception()]
+
+    def close(self) -> WriterStats:
+        """Wait for writes to complete and move staged files into place"""
+        start = timer()
+        self.__submit()
+        if self.__pool:
+            self.__pool.shutdown(wait=True)
+            self.__pool = None
+            futures: list[Future] = self.__futures
+            self.__futures = []
+            for future in futures:
+                future.result()
+        if self.stage and self.archive:
+            for path, dirs, files in os.walk(self.stage):
+                if not dirs and not files:
+                    relpath = os.path.relpath(path, self.stage)
+                    self.archive.add_dir(os.path.join(self.root, relpath))
+                for name in sorted(files):
+                    source = os.path.join(path, name)
+                    relpath = os.path.relpath(source, self.stage)
+                    self.archive.add_file(source, os.path.join(self.root, relpath))
+            shutil.rmtree(self.stage, ignore_errors=True)
+            self.stage = None
+        elif self.stage:
+            shutil.copytree(
+                self.stage, self.root, copy_function=shutil.move, dirs_exist_ok=True
+            )
+            shutil.rmtree(self.stage, ignore_errors=True)
+            self.stage = None
+        self.stats.seconds += timer() - start
+        return self.stats
+
+
+class ImageStats:
+    """Images saved with seconds spent encoding and blocked on encoders"""
+
+    images: int
+    encode: float
+    blocked: float
+
+    def __init__(self, images: int = 0, encode: float = 0, blocked: float = 0):
+        self.images = images
+        self.encode = encode
+        self.blocked = blocked
+
+
+def link_file(source: str, target: str, mode: str = "hard"):
+    """Link target to source, copied if the filesystem cannot hard link"""
+    if os.path.lexists(target):
+        os.remove(target)
+    if mode == "sym":
+        os.symlink(os.path.relpath(source, os.path.dirname(target)), target)
+        return
+    if mode == "hard":
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, target)
+
+
+def save_image(
+    img: Image.Image, path: str, mode: str = None, archive: Archive = None
+) -> float:
+    """Convert and save image, or add to archive if given, return seconds taken"""
+    start = timer()
+    if mode and img.mode != mode:
+        img = img.convert(mode)
+    if archive:
+        data = io.BytesIO()
+        img.save(data, Image.registered_extensions()[os.path.splitext(path)[1]])
+        archive.add(path, data.getvalue())
+    else:
+        img.save(path)
+    return timer() - start
+
+
+class ImageWriter:
+    """Encode and save images on a bounded thread pool
+
+    Pillow releases the GIL while encoding, so rendering the next image overlaps
+    with compressing and writing the previous ones. caller holds the seconds the
+    rendering thread spent inside save, either blocked or encoding inline.
+    """
+
+    stats: ImageStats
+    caller: float
+    archive: Archive
+
+    def __init__(self, *, threads: int = 2, queue: int = 4, archive: Archive = None):
+        self.stats = ImageStats()
+        self.archive = archive
+        self.caller = 0
+        self.__lock = Lock()
+        self.__futures = []
+        self.__slots = BoundedSemaphore(max(1, queue))
+        self.__pool = ThreadPoolExecutor(max_workers=threads) if threads else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def save(self, img: Image.Image, path: str, mode: str = None):
+        """Queue image to be saved, blocks while the queue is full"""
+        start = timer()
+        if not self.__pool:
+            self.__saved(save_image(img, path, mode, self.archive))
+            self.caller += timer() - start
+            return
+        self.__slots.acquire()
+        self.stats.blocked += timer() - start
+        self.caller += timer() - start
+        future = self.__pool.submit(save_image, img, path, mode, self.archive)
+        future.add_done_callback(self.__done)
+        self.__futures.append(future)
+        self.__futures = [f for f in self.__futures if not f.done() or f.exception()]
+
+    def __done(self, future: Future):
+        self.__slots.release()
+        if not future.exception():
+            self.__saved(future.result())
+
+    def __saved(self, seconds: float):
+        with self.__lock:
+            self.stats.images += 1
+            self.stats.encode += seconds
+
+    def close(self) -> ImageStats:
+        """Wait for queued images to be saved"""
+        if self.__pool:
+            start = timer()
+            self.__pool.shutdown(wait=True)
+            self.__pool = None
+            self.stats.blocked += timer() - start
+            futures: list[Future] = self.__futures
+            self.__futures = []
+            for future in futures:
+                future.result()
+        return self.stats